@@ -0,0 +1,54 @@
+'''Image URL encoding and decoding, for every art URL of every item and texture.'''
+import random
+
+import corpus
+from harness import benchmark
+
+from libs import pykodi
+
+ART_HOSTS = ('https://image.tmdb.org/t/p/original/', 'https://assets.fanart.tv/fanart/movies/',
+    'https://artworks.thetvdb.com/banners/')
+
+def image_urls(count, seed=6):
+    '''Art URLs as the library has them, many repeated like the art shared by seasons and episodes.'''
+    rand = random.Random(seed)
+    paths = corpus.video_paths(max(1, count // 10), seed)
+    unique = []
+    for path in paths:
+        kind = rand.random()
+        if kind < 0.4:
+            unique.append(rand.choice(ART_HOSTS) + '{0:x}.jpg'.format(rand.getrandbits(64)))
+        elif kind < 0.7:
+            unique.append(pykodi.quoteimage(path.rsplit('.', 1)[0] + '-poster.jpg'))
+        elif kind < 0.9:
+            unique.append('image://video@' + pykodi.quote_imagepath(path) + '/')
+        else:
+            unique.append(pykodi.quoteimage(rand.choice(ART_HOSTS) + '{0:x}.png'.format(rand.getrandbits(64))))
+    result = []
+    while len(result) < count:
+        # the same art comes up again a few items later, like a season's poster for each episode
+        window = [url for url in rand.sample(unique, min(len(unique), 50)) for _ in range(rand.randint(1, 19))]
+        rand.shuffle(window)
+        result.extend(window)
+    return result[:count]
+
+def clear_caches():
+    pykodi.unquoteimage.cache_clear()
+    pykodi.parseimage.cache_clear()
+    pykodi.quoteimage.cache_clear()
+
+@benchmark('imagecodec.unquoteimage', 1000000, repeat=3)
+def unquoteimage(count):
+    urls = image_urls(count)
+    def run():
+        clear_caches()
+        return [(pykodi.unquoteimage(url), pykodi.parseimage(url)) for url in urls]
+    return run
+
+@benchmark('imagecodec.quoteimage', 1000000, repeat=3)
+def quoteimage(count):
+    paths = [pykodi.unquoteimage(url) for url in image_urls(count)]
+    def run():
+        clear_caches()
+        return [pykodi.quoteimage(path) for path in paths]
+    return run
@@ -0,0 +1,23 @@
+'''Service startup, importing service.py in a new interpreter like Kodi does at boot.'''
+import os
+import subprocess
+import sys
+
+from harness import benchmark
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests')
+IMPORT_SCRIPT = '''
+import sys
+import kodistubs
+kodistubs.install_kodi_modules()
+import service
+from libs.addonsettings import settings
+print('requests' in sys.modules, bool(settings.__dict__.get('loaded')))
+'''
+
+@benchmark('import.service', 5, repeat=3)
+def import_service(count):
+    def run():
+        return [subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=TESTS_DIR, capture_output=True,
+            text=True, check=True).stdout.strip() for _ in range(count)]
+    return run
@@ -0,0 +1,19 @@
+'''Path exclusions, checked for every item of a run.'''
+import corpus
+from harness import benchmark
+
+from libs.utils import PathMatcher
+
+# all 10 exclusion slots in use
+FOLDERS = ('/storage/videos/Movies/Trailers', 'smb://NAS/Media/Movies/Kids', 'C:\\Media\\Movies\\Extras')
+PREFIXES = ('nfs://192.168.1.10/export/movies/Sample', '/mnt/media/Фильмы/Сталкер', 'smb://NAS/Media/TV/Dark')
+REGEXES = (r'.*[\\/](?:[Ss]ample|[Tt]railer)s?[\\/]', r'(?i).*-(?:sample|trailer)\.\w+$', r'.*\(19[2-4]\d\)',
+    r'.*[\\/](\w)\1\w*[\\/]')
+
+@benchmark('pathmatcher.matches', 300000)
+def matches(count):
+    matcher = PathMatcher(FOLDERS, PREFIXES, REGEXES)
+    paths = corpus.video_paths(count, seed=5)
+    def run():
+        return [matcher.matches(path) for path in paths]
+    return run
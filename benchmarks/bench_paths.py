@@ -0,0 +1,47 @@
+'''Path logic that runs for each item: unstacking, file name cleanup and artwork paths.'''
+import corpus
+from harness import benchmark
+
+from libs import mediainfo as info, utils
+
+@benchmark('paths.movie_path_list', 20000)
+def movie_path_list(count):
+    paths = corpus.movie_paths(count)
+    def run():
+        return [utils._get_movie_path_list(path) for path in paths]
+    return run
+
+@benchmark('paths.possible_cleannames', 50000)
+def possible_cleannames(count):
+    names = corpus.names(count)
+    def run():
+        return [list(utils.iter_possible_cleannames(name, slug)) for name, slug in names]
+    return run
+
+@benchmark('paths.cleanest_name', 100000)
+def cleanest_name(count):
+    names = corpus.names(count)
+    def run():
+        return [utils.build_cleanest_name(name, slug) for name, slug in names]
+    return run
+
+@benchmark('paths.natural_sort', 50000)
+def natural_sort(count):
+    paths = corpus.video_paths(count)
+    def run():
+        return [utils.natural_sort(path) for path in paths]
+    return run
+
+@benchmark('paths.artwork_basepath', 10000)
+def artwork_basepath(count):
+    items = [info.MediaItem(jsonitem) for jsonitem in corpus.movie_items(count)]
+    def run():
+        return [info.build_artwork_basepath(item, arttype) for item in items for arttype in ('poster', 'fanart')]
+    return run
+
+@benchmark('paths.video_thumbnail_path', 20000)
+def video_thumbnail_path(count):
+    paths = corpus.video_paths(count)
+    def run():
+        return [info.build_video_thumbnail_path(path) for path in paths]
+    return run
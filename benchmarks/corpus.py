@@ -0,0 +1,80 @@
+'''Generated library paths and titles for the benchmarks. The same seed always gives the same corpus.'''
+import random
+
+TITLES = ('The Matrix', 'Alien', 'Star Wars: Episode IV - A New Hope', 'What About Bob?', 'Se7en',
+    'Amélie', 'Léon: The Professional', 'Das Boot', 'Сталкер', 'Солярис', '千と千尋の神隠し', 'となりのトトロ',
+    '올드보이', 'Crouching Tiger, Hidden Dragon', 'Mission: Impossible', 'Monsters, Inc.', 'Dr. Strangelove',
+    'The Good, the Bad and the Ugly', '12 Angry Men', '2001: A Space Odyssey', 'Wall·E', 'Ça tourne',
+    'Hera Pheri...', 'Who Framed Roger Rabbit?', 'AC/DC: Live at River Plate', 'M*A*S*H', 'Face/Off',
+    'Zoë "Live" <Extended>', 'Trailing dot.', 'Trailing space ')
+
+SHOWS = ('Breaking Bad', 'The Office (US)', 'Doctor Who (2005)', 'Star Trek: The Next Generation', 'Shōgun',
+    'Dark', 'Babylon 5', "Marvel's Agents of S.H.I.E.L.D.", 'Кухня', '深夜食堂', 'Law & Order: SVU')
+
+# (root, separator)
+ROOTS = (('/storage/videos/Movies/', '/'), ('smb://NAS/Media/Movies/', '/'),
+    ('nfs://192.168.1.10/export/movies/', '/'), ('C:\\Media\\Movies\\', '\\'), ('\\\\SERVER\\Movies\\', '\\'),
+    ('/mnt/media/Фильмы/', '/'))
+
+STACK_PARTS = (('cd1', 'cd2'), ('CD1', 'CD2'), ('part1', 'part2'), ('pt1', 'pt2'), ('disc1', 'disc2'),
+    ('dvd1', 'dvd2'), ('cd a', 'cd b'), ('a', 'b'), ('Part 1', 'Part 2'))
+
+EXTENSIONS = ('.mkv', '.mp4', '.avi', '.m2ts')
+
+def movie_title(rand):
+    return '{0} ({1})'.format(rand.choice(TITLES), rand.randint(1920, 2024))
+
+def movie_path(rand):
+    '''A movie file path like Kodi stores them, stacked, disc structure, or a plain file.'''
+    root, sep = rand.choice(ROOTS)
+    title = movie_title(rand)
+    folder = root + title + sep
+    kind = rand.random()
+    if kind < 0.2:
+        part1, part2 = rand.choice(STACK_PARTS)
+        ext = rand.choice(EXTENSIONS)
+        return 'stack://{0}{1} {2}{4} , {0}{1} {3}{4}'.format(folder, title, part1, part2, ext)
+    if kind < 0.3:
+        return folder + 'VIDEO_TS' + sep + 'VIDEO_TS.IFO'
+    if kind < 0.4:
+        return folder + 'BDMV' + sep + 'index.bdmv'
+    if kind < 0.45:
+        return folder + title + '.iso'
+    return folder + title + rand.choice(EXTENSIONS)
+
+def episode_path(rand):
+    root, sep = rand.choice(ROOTS)
+    show = rand.choice(SHOWS)
+    season = rand.randint(1, 12)
+    episode = rand.randint(1, 24)
+    return '{0}{1}{4}Season {2}{4}{1} - S{2:02d}E{3:02d}{5}'.format(root.replace('Movies', 'TV'), show, season,
+        episode, sep, rand.choice(EXTENSIONS))
+
+def movie_paths(count, seed=1):
+    rand = random.Random(seed)
+    return [movie_path(rand) for _ in range(count)]
+
+def video_paths(count, seed=2):
+    '''Movies and episodes mixed, like the paths of a video library run.'''
+    rand = random.Random(seed)
+    return [movie_path(rand) if rand.random() < 0.4 else episode_path(rand) for _ in range(count)]
+
+def names(count, seed=3):
+    '''Titles to clean up for file names, some with a unique slug.'''
+    rand = random.Random(seed)
+    return [(rand.choice(TITLES + SHOWS), rand.choice((None, None, 'mb' + str(rand.randint(1, 999)))))
+        for _ in range(count)]
+
+def movie_items(count, seed=4):
+    '''JSON for library movies and episodes, as Kodi lists them.'''
+    rand = random.Random(seed)
+    result = []
+    for dbid in range(1, count + 1):
+        if rand.random() < 0.5:
+            result.append({'movieid': dbid, 'label': rand.choice(TITLES), 'file': movie_path(rand), 'art': {},
+                'year': rand.randint(1920, 2024)})
+        else:
+            result.append({'episodeid': dbid, 'label': 'Episode', 'file': episode_path(rand), 'art': {},
+                'tvshowid': 1, 'showtitle': rand.choice(SHOWS), 'season': rand.randint(0, 12),
+                'episode': rand.randint(1, 24)})
+    return result
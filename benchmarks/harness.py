@@ -0,0 +1,60 @@
+'''Registry and timing for the benchmarks.'''
+import gc
+import hashlib
+import time
+
+REPEAT = 5
+CALIBRATION_SIZE = 100000
+CALIBRATION_REPEAT = 5
+
+# name: (setup function, item count, repeat)
+BENCHMARKS = {}
+
+def benchmark(name, count, repeat=REPEAT):
+    '''Register a benchmark. `setup(count)` builds its input and returns a function that runs it once
+    and returns the results, which are compared with the baseline so a change in output shows up too.'''
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, count, repeat)
+        return setup
+    return decorator
+
+def timed(function):
+    # like timeit, so collections triggered by earlier setup don't land in one run
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = function()
+        return time.perf_counter() - start, result
+    finally:
+        gc.enable()
+
+def calibrate():
+    '''Time of a fixed pure Python workload. Benchmark times are recorded relative to it,
+    so a baseline from one machine still means something on another.'''
+    def workload():
+        total = 0
+        for number in range(CALIBRATION_SIZE):
+            total += len(str(number).replace('1', 'one').lower())
+        return total
+    return min(timed(workload)[0] for _ in range(CALIBRATION_REPEAT))
+
+def digest(results):
+    result = hashlib.sha1()
+    for item in results:
+        result.update(repr(item).encode('utf-8'))
+    return result.hexdigest()
+
+def run_benchmark(name, scale):
+    '''Best of a few runs, each timed next to a calibration as the speed of a machine drifts.
+    `relative` is the time per million items in calibration units.'''
+    setup, count, repeat = BENCHMARKS[name]
+    count = max(1, int(count * scale))
+    function = setup(count)
+    best = None
+    for _ in range(repeat):
+        elapsed, results = timed(function)
+        relative = elapsed / calibrate() * 1000000 / count
+        if best is None or relative < best[1]:
+            best = elapsed, relative
+    return {'items': count, 'seconds': best[0], 'relative': best[1], 'digest': digest(results)}
@@ -0,0 +1,81 @@
+'''Microbenchmarks for the per-item path and URL logic, outside Kodi with stand-ins for its modules.
+
+    python benchmarks/run.py                  run all, compare with baseline.json
+    python benchmarks/run.py paths.           only benchmarks whose names start with 'paths.'
+    python benchmarks/run.py --save-baseline  record the current results as the baseline
+
+Times are compared per item, relative to a calibration loop. It fails on results that differ
+from the baseline or anything slower than the baseline by more than the tolerance.'''
+import argparse
+import glob
+import importlib
+import json
+import os
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), 'tests'))
+
+from kodistubs import install_kodi_modules
+install_kodi_modules()
+
+import harness
+
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+DEFAULT_TOLERANCE = 1.5
+
+def load_benchmarks():
+    for filename in sorted(glob.glob(os.path.join(BENCHMARK_DIR, 'bench_*.py'))):
+        importlib.import_module(os.path.splitext(os.path.basename(filename))[0])
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the microbenchmarks and compare with the saved baseline")
+    parser.add_argument('names', nargs='*', help="name prefixes of the benchmarks to run")
+    parser.add_argument('--save-baseline', action='store_true', help="save these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+        help="fail if this many times slower than the baseline (default %(default)s)")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply the item counts, for a quick run")
+    args = parser.parse_args()
+
+    load_benchmarks()
+    names = [name for name in sorted(harness.BENCHMARKS)
+        if not args.names or any(name.startswith(prefix) for prefix in args.names)]
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = {}
+    failures = []
+    for name in names:
+        result = harness.run_benchmark(name, args.scale)
+        results[name] = result
+        line = "{0:<32} {1:>8} items {2:>9.4f}s {3:>10.1f} rel".format(name, result['items'], result['seconds'],
+            result['relative'])
+
+        saved = baseline.get(name)
+        if saved and not args.save_baseline:
+            ratio = result['relative'] / saved['relative']
+            line += " {0:>6.2f}x baseline".format(ratio)
+            if ratio > args.tolerance:
+                failures.append("{0} is {1:.2f}x slower than the baseline".format(name, ratio))
+            if saved['items'] == result['items'] and saved['digest'] != result['digest']:
+                failures.append("{0} gave different results than the baseline".format(name))
+        print(line)
+
+    if args.save_baseline:
+        for name, result in results.items():
+            baseline[name] = {'items': result['items'], 'relative': round(result['relative'], 1),
+                'digest': result['digest']}
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+            f.write('\n')
+        print("Saved baseline to " + BASELINE_FILE)
+        return 0
+    for failure in failures:
+        print("FAIL: " + failure)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,18 @@
-import os
-import re
+import time
+import urllib.parse as urlparse
 from typing import Iterable, Union
 import xbmc
 import xbmcgui
+import xbmcvfs
 
-from filemanager import FileManager, FileError
-from libs import mediainfo as info, mediatypes, quickjson
-from libs.addonsettings import settings, PROGRESS_DISPLAY_FULLPROGRESS, PROGRESS_DISPLAY_NONE, EXCLUSION_PATH_TYPE_FOLDER, EXCLUSION_PATH_TYPE_PREFIX, EXCLUSION_PATH_TYPE_REGEX, SCAN_NEW_DATABASE
+from filemanager import FileManager, FileError, get_downloadable_art, get_test_extension
+from libs import mediainfo as info, mediatypes, memprofile, quickjson, rpcprofile, runmetrics, timing
+from libs.addonsettings import settings, PROGRESS_DISPLAY_FULLPROGRESS, PROGRESS_DISPLAY_NONE, SCAN_NEW_DATABASE, \
+    EXISTING_FILE_OVERWRITE
 from libs.processeditems import ProcessedItems
 from libs.pykodi import localize as L, log, get_conditional, check_utf8
 from libs.quickjson import JSONException
+from libs.utils import get_pathsep
 
 ADDING_ARTWORK_MESSAGE = 32020
 ARTWORK_UPDATED_MESSAGE = 32022
@@ -20,18 +23,35 @@ FILENAME_ENCODING_ERROR = 32040
 THROTTLE_TIME = 0.15
 MESSAGE_CLEAR_COUNT = 200
 PROGRESS_UPDATE_COUNT = 100
+PREFETCH_BATCH_SIZE = 20
+# for projected runtime of a dry run, a rough guess of the time to download and save one image
+ESTIMATED_DOWNLOAD_TIME = 0.5
+# existing files of each art type to check for the size of planned downloads
+SIZE_SAMPLE_COUNT = 20
 
 class ArtworkProcessor(object):
     def __init__(self, monitor=None):
+        settings.update_settings()
+        mediatypes.update_settings()
         self.monitor = monitor or xbmc.Monitor()
         self.downloader = None
+        self.metrics = None
+        self.background = False
+        self.item_done = None
+        self.artcount = 0
         self.processed = ProcessedItems(settings.determine_new_algo != SCAN_NEW_DATABASE)
         self.progressdisplay = ProgressDisplay(
             self.monitor,
             settings.progressdisplay == PROGRESS_DISPLAY_FULLPROGRESS,
             settings.final_notification)
-        settings.update_settings()
-        mediatypes.update_settings()
+        memprofile.watch('quickcache', lambda: len(info.quickcache))
+        memprofile.watch('alreadycached', lambda: len(self.downloader.alreadycached))
+
+    @property
+    def throttle_time(self):
+        if getattr(self.monitor, 'playing', False):
+            return THROTTLE_TIME + settings.playback_pause
+        return THROTTLE_TIME
 
     @property
     def processor_busy(self):
@@ -54,27 +74,79 @@ class ArtworkProcessor(object):
 
     def init_run(self, show_progress, big_list, totalcount):
         self.downloader = FileManager(big_list)
+        info.set_bulk_lookups(big_list)
+        timing.start(settings.log_timing)
+        rpcprofile.start(settings.profile_jsonrpc)
+        memprofile.start(settings.profile_memory, settings.profile_memory_interval)
 
         populate_centraldirs()
         if show_progress:
             self.create_progress(totalcount)
 
     def finish_run(self):
+        memprofile.stop()
+        stages = timing.stop()
+        if stages is not None:
+            log(timing.summary(stages), xbmc.LOGINFO)
+        profiler = rpcprofile.stop()
+        if profiler:
+            log(profiler.report(), xbmc.LOGINFO)
         info.clear_cache()
+        info.set_bulk_lookups(False)
+        self.downloader.log_connection_stats()
         self.downloader = None
         self.progressdisplay.close_progress()
 
-    def process_list(self, in_list, alwaysnotify=False):
-        return self.process_list_with_total(in_list, len(in_list), alwaysnotify)
+    def process_list(self, in_list, alwaysnotify=False, runname='items'):
+        return self.process_list_with_total(in_list, len(in_list), alwaysnotify, runname)
+
+    def process_list_with_total(self, medialist, totalcount, alwaysnotify=False, runname='items', background=False,
+            item_done=None):
+        '''`background` marks a long pass over the library, which can wait out a library scan.
+        Short lists of requested or recently added items carry on through one.
+        `item_done(mediatype, dbid)` is called after each item is processed, the list is read ahead of that.'''
+        self.background = background
+        self.item_done = item_done
+        self.open_run(totalcount, runname)
+        aborted = True
+        try:
+            aborted = not self.process_inline(medialist)
+        finally:
+            self.close_run(aborted, alwaysnotify)
 
-    def process_list_with_total(self, medialist, totalcount, alwaysnotify=False):
-        self.init_run(True, totalcount > 100, totalcount)
+        return not aborted
 
+    def open_run(self, totalcount=0, runname='items'):
+        '''Start a run that lists are added to with `process_inline` as they come in, until `close_run`.'''
+        self.init_run(True, totalcount > 100, totalcount)
+        self.artcount = 0
+        if settings.write_metrics:
+            self.metrics = runmetrics.RunMetrics(runname, totalcount)
+
+    def close_run(self, aborted=False, alwaysnotify=False):
+        try:
+            if self.artcount or alwaysnotify:
+                self.progressdisplay.finalupdate(finalmessage(self.artcount))
+            if self.metrics:
+                try:
+                    runmetrics.write(self.metrics.build_record(self.downloader, aborted))
+                except (IOError, OSError) as ex:
+                    log("Couldn't write run metrics: {0}".format(ex), xbmc.LOGWARNING)
+        finally:
+            self.metrics = None
+            self.finish_run()
+            self.background = False
+            self.item_done = None
+
+    def process_inline(self, medialist, count=0):
+        '''Process a list in the middle of the current run, sharing its state, to put it ahead
+        of the rest of the current list. `count` adds the items of a list that wasn't in the total.'''
+        if count:
+            self.progressdisplay.totalcount += count
+            if self.metrics:
+                self.metrics.totalcount += count
         aborted, artcount = self._process_list(medialist)
-        if artcount or alwaysnotify:
-            self.progressdisplay.finalupdate(finalmessage(artcount))
-        self.finish_run()
-
+        self.artcount += artcount
         return not aborted
 
     def _process_list(self, medialist: Iterable[Union[info.MediaItem, int]]):
@@ -82,7 +154,13 @@ class ArtworkProcessor(object):
         artcount = 0
         aborted = False
         progress_count = 0
-        for mediaitem in medialist:
+        checkpoint = getattr(self.monitor, 'checkpoint', None)
+        for mediaitem, excluded in timing.iter_timed(iter_with_prefetch(medialist), 'listing'):
+            if checkpoint:
+                with timing.stage('checkpoint'):
+                    if checkpoint(self):
+                        aborted = True
+                        break
             if isinstance(mediaitem, int):
                 progress_count += mediaitem
                 if progress_count > PROGRESS_UPDATE_COUNT:
@@ -90,14 +168,19 @@ class ArtworkProcessor(object):
                     progress_count = 0
             else:
                 progress_count += 1
+            if self.metrics:
+                self.metrics.scanned += mediaitem if isinstance(mediaitem, int) else 1
 
-            if is_excluded(mediaitem):
+            if excluded:
+                if self.item_done and not isinstance(mediaitem, int):
+                    self.item_done(mediaitem.mediatype, mediaitem.dbid)
                 if self.monitor.abortRequested():
                     aborted = True
                     break
                 continue
 
-            info.add_additional_iteminfo(mediaitem)
+            with timing.stage('iteminfo'):
+                info.add_additional_iteminfo(mediaitem)
             try:
                 services_hit = self._process_item(mediaitem)
             except JSONException as ex:
@@ -111,6 +194,11 @@ class ArtworkProcessor(object):
                 log(ex.message, xbmc.LOGERROR)
                 self.notify_warning(ex.message, None, True)
             artcount += len(mediaitem.updatedart)
+            if self.item_done:
+                self.item_done(mediaitem.mediatype, mediaitem.dbid)
+            if self.metrics:
+                self.metrics.add_item(mediaitem)
+            memprofile.tick()
 
             if mediaitem.updatedart or progress_count > PROGRESS_UPDATE_COUNT:
                 msg = mediaitem.label if mediaitem.updatedart else None
@@ -121,9 +209,11 @@ class ArtworkProcessor(object):
                 if self.monitor.abortRequested():
                     aborted = True
                     break
-            elif self.monitor.waitForAbort(THROTTLE_TIME):
-                aborted = True
-                break
+            else:
+                with timing.stage('throttle'):
+                    if self.monitor.waitForAbort(self.throttle_time):
+                        aborted = True
+                        break
 
         if progress_count:
             self.progressdisplay.update_progress(None, progress_count)
@@ -131,25 +221,45 @@ class ArtworkProcessor(object):
         log("Finished processing list")
         return aborted, artcount
 
+    def plan_list_with_total(self, medialist, totalcount):
+        '''Walk the list like a run without downloading anything or updating the library.
+        Returns a RunPlan of what a run would do.'''
+        self.init_run(True, totalcount > 100, totalcount)
+        plan = RunPlan(self.throttle_time)
+        started = time.monotonic()
+        progress_count = 0
+        for mediaitem, excluded in iter_with_prefetch(medialist):
+            if isinstance(mediaitem, int):
+                progress_count += mediaitem
+            else:
+                progress_count += 1
+                if excluded:
+                    plan.excluded += 1
+                else:
+                    info.add_additional_iteminfo(mediaitem, readonly=True)
+                    plan.add_item(mediaitem)
+            if progress_count > PROGRESS_UPDATE_COUNT:
+                self.progressdisplay.update_progress(None, progress_count)
+                progress_count = 0
+            if self.monitor.abortRequested():
+                plan.aborted = True
+                break
+        plan.listing_time = time.monotonic() - started
+        self.finish_run()
+        return plan
+
     def _process_item(self, mediaitem: info.MediaItem):
         log("Processing {0} '{1}' automatically.".format(mediaitem.mediatype, mediaitem.label))
         mediatype = mediaitem.mediatype
 
-        if mediatypes.generatethumb(mediaitem.mediatype) and \
-                mediaitem.art.get('thumb', '').startswith('http'):
-            newthumb = info.build_video_thumbnail_path(mediaitem.file)
-            if newthumb:
-                log("Setting thumbnail to 'kodi generated'")
-                mediaitem.updatedart['thumb'] = newthumb
-                if 'thumb' in mediaitem.art:
-                    del mediaitem.art['thumb']
-
-        services_hit, error = self.downloader.downloadfor(mediaitem)
+        set_generated_thumb(mediaitem)
+        services_hit, error = self.downloader.downloadfor(mediaitem, getattr(self.monitor, 'playing', False))
         if mediaitem.updatedart:
             add_art_to_library(mediatype, mediaitem.dbid, mediaitem.updatedart)
         else:
             log("No updates to artwork")
-        self.cachelocal(mediaitem, mediaitem.updatedart)
+        with timing.stage('texturecache'):
+            self.cachelocal(mediaitem, mediaitem.updatedart)
 
         if error:
             if isinstance(error, dict):
@@ -175,6 +285,93 @@ class ArtworkProcessor(object):
             artmap.update(toset)
             self.downloader.cachefor(artmap)
 
+class RunPlan(object):
+    '''Counts of what a run would download, built by `ArtworkProcessor.plan_list_with_total`.'''
+    def __init__(self, throttle_time):
+        self.throttle_time = throttle_time
+        self.aborted = False
+        self.items = 0
+        self.excluded = 0
+        self.items_with_downloads = 0
+        self.downloads = 0
+        self.existing = 0
+        self.by_mediatype = {}
+        self.by_arttype = {}
+        self.by_host = {}
+        self.listing_time = 0
+        # folder: set of filenames, to check for existing files without asking for each one
+        self.dirindex = {}
+        # arttype: sizes of existing files
+        self.sizes = {}
+
+    def add_item(self, mediaitem):
+        self.items += 1
+        if not info.can_saveartwork(mediaitem):
+            return
+        set_generated_thumb(mediaitem)
+        downloads = 0
+        for arttype, url in get_downloadable_art(mediaitem).items():
+            basepath = info.build_artwork_basepath(mediaitem, arttype)
+            if not basepath:
+                continue
+            testpath = basepath + '.' + get_test_extension(url)
+            basetype = arttype.rstrip('0123456789')
+            if self._exists(testpath):
+                sizes = self.sizes.setdefault(basetype, [])
+                if len(sizes) < SIZE_SAMPLE_COUNT:
+                    sizes.append(xbmcvfs.Stat(testpath).st_size())
+                if settings.handle_existing_files != EXISTING_FILE_OVERWRITE:
+                    self.existing += 1
+                    continue
+            downloads += 1
+            _increment(self.by_mediatype, mediaitem.mediatype)
+            _increment(self.by_arttype, basetype)
+            _increment(self.by_host, urlparse.urlparse(url).netloc)
+        if downloads:
+            self.downloads += downloads
+            self.items_with_downloads += 1
+
+    def _exists(self, path):
+        pathsep = get_pathsep(path)
+        folder, filename = path.rsplit(pathsep, 1)
+        files = self.dirindex.get(folder)
+        if files is None:
+            files = self.dirindex[folder] = set(xbmcvfs.listdir(folder + pathsep)[1])
+        return filename in files
+
+    @property
+    def estimated_bytes(self):
+        '''Estimated from the average size of existing files of the same type,
+        art types without any existing files are left out.'''
+        result = 0
+        for arttype, count in self.by_arttype.items():
+            sizes = self.sizes.get(arttype)
+            if sizes:
+                result += count * sum(sizes) // len(sizes)
+        return result
+
+    @property
+    def projected_time(self):
+        return self.listing_time + self.items_with_downloads * self.throttle_time \
+            + self.downloads * ESTIMATED_DOWNLOAD_TIME
+
+    def report(self):
+        lines = ["Items: {0}, excluded: {1}, with downloads: {2}".format(
+            self.items, self.excluded, self.items_with_downloads)]
+        if self.aborted:
+            lines.append("Stopped before the end of the library, counts are partial")
+        lines.append("Downloads: {0}, existing files kept: {1}".format(self.downloads, self.existing))
+        for heading, counts in (("By media type", self.by_mediatype), ("By art type", self.by_arttype),
+                ("By host", self.by_host)):
+            if counts:
+                lines.append(heading + ": " + ', '.join('{0} {1}'.format(key, count)
+                    for key, count in sorted(counts.items(), key=lambda item: -item[1])))
+        lines.append("Estimated size: {0:.1f} MB (from existing files of each art type)".format(
+            self.estimated_bytes / 1048576))
+        lines.append("Projected time: {0:.1f} hours ({1}s between items, about {2}s per download)".format(
+            self.projected_time / 3600, self.throttle_time, ESTIMATED_DOWNLOAD_TIME))
+        return '\n'.join(lines)
+
 class ProgressDisplay(object):
     def __init__(self, monitor, display_full_progress: bool, display_final_notification: bool):
         self.monitor = monitor
@@ -234,8 +431,10 @@ def add_art_to_library(mediatype, dbid, selectedart):
         if arttype.startswith('animated') and url and url.startswith('http'):
             selectedart[arttype] = None
 
-    info.update_art_in_library(mediatype, dbid, selectedart)
-    info.remove_local_from_texturecache(selectedart.values())
+    with timing.stage('library'):
+        info.update_art_in_library(mediatype, dbid, selectedart)
+    with timing.stage('invalidate'):
+        info.remove_local_from_texturecache(selectedart.values())
 
 def populate_centraldirs():
     # INFO: out here because there is no callback to detect changes for Kodi settings like there is for add-on settings
@@ -245,24 +444,41 @@ def populate_centraldirs():
     path = quickjson.get_settingvalue('videolibrary.moviesetsfolder')
     mediatypes.central_directories[mediatypes.MOVIESET] = path
 
+def _increment(counts, key):
+    counts[key] = counts.get(key, 0) + 1
+
 def finalmessage(count):
     return L(ARTWORK_UPDATED_MESSAGE).format(count) if count else L(NO_ARTWORK_UPDATED_MESSAGE)
 
+def iter_with_prefetch(medialist, batchsize=PREFETCH_BATCH_SIZE):
+    '''Read ahead in `medialist` to fetch extra item info from Kodi in batches.
+    Yields (item, excluded) so the path exclusions are checked once for each item.'''
+    batch = []
+    for mediaitem in medialist:
+        batch.append((mediaitem, is_excluded(mediaitem)))
+        if len(batch) >= batchsize:
+            info.prefetch_multiple_fanart([item for item, excluded in batch if not excluded])
+            yield from batch
+            batch = []
+    if batch:
+        info.prefetch_multiple_fanart([item for item, excluded in batch if not excluded])
+        yield from batch
+
+def set_generated_thumb(mediaitem):
+    '''Replace a remote thumbnail with one Kodi generates from the video, for media types set to that.
+    The remote one is then not downloaded, by a run or in a dry run's plan.'''
+    if mediatypes.generatethumb(mediaitem.mediatype) and \
+            mediaitem.art.get('thumb', '').startswith('http'):
+        newthumb = info.build_video_thumbnail_path(mediaitem.file)
+        if newthumb:
+            log("Setting thumbnail to 'kodi generated'")
+            mediaitem.updatedart['thumb'] = newthumb
+            if 'thumb' in mediaitem.art:
+                del mediaitem.art['thumb']
+
 def is_excluded(mediaitem):
     if isinstance(mediaitem, int):
         return True
     if mediaitem.file is None:
         return False
-    for exclusion in settings.pathexclusion:
-        if exclusion["type"] == EXCLUSION_PATH_TYPE_FOLDER:
-            path_file = os.path.realpath(os.path.join(mediaitem.file, ''))
-            path_excl = os.path.realpath(os.path.join(exclusion["folder"], ''))
-            if os.path.commonprefix([path_file, path_excl]) == path_excl:
-                return True
-        if exclusion["type"] == EXCLUSION_PATH_TYPE_PREFIX:
-            if mediaitem.file.startswith(exclusion["prefix"]):
-                return True
-        if exclusion["type"] == EXCLUSION_PATH_TYPE_REGEX:
-            if re.match(exclusion["regex"], mediaitem.file):
-                return True
-    return False
+    return settings.pathexclusion.matches(mediaitem.file)
@@ -2,7 +2,7 @@ import sys
 import xbmc
 
 from artworkprocessor import ArtworkProcessor
-from libs import mediainfo as info, quickjson
+from libs import mediainfo as info, pykodi, quickjson
 
 def main():
     listitem = sys.listitem
@@ -10,10 +10,19 @@ def main():
     dbid = get_dbid(listitem)
 
     if dbid and mediatype:
+        if service_busy():
+            # the service puts it ahead of its current work
+            quickjson.notify_all('script.artwork.dump:control', 'ProcessItem', {'mediatype': mediatype, 'dbid': dbid})
+            return
         processor = ArtworkProcessor()
         item = quickjson.get_item_details(dbid, mediatype)
         processor.process_list((info.MediaItem(item),), True)
 
+def service_busy():
+    return pykodi.get_conditional('String.IsEqual(Window(Home).Property(ArtworkDump.Status),processing) | '
+        'String.IsEqual(Window(Home).Property(ArtworkDump.Status),paused) | '
+        'String.IsEqual(Window(Home).Property(ArtworkDump.Status),signalled)')
+
 def get_mediatype(listitem):
     mediatype = listitem.getVideoInfoTag().getMediaType()
     if not mediatype:
@@ -4,8 +4,7 @@ import xbmcgui
 from artworkprocessor import ArtworkProcessor
 from filemanager import FileManager
 from libs import mediainfo as info, mediatypes, pykodi, quickjson, utils
-from libs.addonsettings import settings
-from libs.pykodi import check_utf8, localize as L
+from libs.pykodi import check_utf8, localize as L, log
 
 class M(object):
     STOP = 32403
@@ -15,6 +14,8 @@ class M(object):
     FOR_ALL_AUDIO = 32422
     CACHE_VIDEO_ARTWORK = 32424
     CACHE_MUSIC_ARTWORK = 32425
+    PLAN_ALL_VIDEOS = 32426
+    PLAN_ALL_AUDIO = 32427
     CACHED_COUNT = 32038
     LISTING_ALL = 32028
 
@@ -29,9 +30,6 @@ class M(object):
     SONGS = 36921
 
 def main():
-    settings.update_settings()
-    mediatypes.update_settings()
-
     processor = ArtworkProcessor()
     if processor.processor_busy:
         options = [(L(M.STOP), 'CancelCurrent')]
@@ -42,7 +40,9 @@ def main():
             (L(M.FOR_NEW_AUDIO), 'ProcessNewMusic'),
             (L(M.FOR_ALL_AUDIO), 'ProcessAllMusic'),
             (L(M.CACHE_VIDEO_ARTWORK), cache_artwork),
-            (L(M.CACHE_MUSIC_ARTWORK), lambda: cache_artwork('music'))
+            (L(M.CACHE_MUSIC_ARTWORK), lambda: cache_artwork('music')),
+            (L(M.PLAN_ALL_VIDEOS), lambda: plan_run(processor, 'videos')),
+            (L(M.PLAN_ALL_AUDIO), lambda: plan_run(processor, 'music'))
         ]
 
     selected = xbmcgui.Dialog().select("Artwork Dump", [option[0] for option in options])
@@ -59,6 +59,22 @@ def cache_artwork(librarytype='videos'):
     cached = runon_medialist(lambda mi: fileman.cachefor(mi.art), heading, librarytype, fg=False)
     xbmcgui.Dialog().ok("Artwork Dump", L(M.CACHED_COUNT).format(cached))
 
+def plan_run(processor, librarytype='videos'):
+    media_types = mediatypes.videotypes if librarytype == 'videos' else mediatypes.audiotypes
+    media_lists = [quickjson.iter_item_list(mediatype) for mediatype in media_types]
+    totalcount = sum(media_list[1] for media_list in media_lists)
+
+    def flatten_to_mediaitems():
+        for medialist in media_lists:
+            for mediaitem in medialist[0]:
+                yield info.MediaItem(mediaitem)
+
+    plan = processor.plan_list_with_total(flatten_to_mediaitems(), totalcount)
+    report = plan.report()
+    log(report, xbmc.LOGINFO)
+    heading = L(M.PLAN_ALL_VIDEOS if librarytype == 'videos' else M.PLAN_ALL_AUDIO)
+    xbmcgui.Dialog().textviewer("Artwork Dump: " + heading, report)
+
 def runon_medialist(function, heading, medialist='videos', typelabel=None, fg=False):
     progress = xbmcgui.DialogProgress() if fg else xbmcgui.DialogProgressBG()
     progress.create(heading)
@@ -66,9 +82,9 @@ def runon_medialist(function, heading, medialist='videos', typelabel=None, fg=Fa
 
     if medialist == 'videos':
         steps_to_run = [(lambda: quickjson.get_item_list(mediatypes.MOVIE), L(M.MOVIES)),
-            (info.get_cached_tvshows, L(M.SERIES)),
-            (lambda: quickjson.get_item_list(mediatypes.SEASON), L(M.SEASONS)),
-            (lambda: quickjson.get_item_list(mediatypes.MOVIESET), L(M.MOVIESETS)),
+            (lambda: list(info.get_cached_parents(mediatypes.TVSHOW).values()), L(M.SERIES)),
+            (lambda: list(info.get_cached_parents(mediatypes.SEASON).values()), L(M.SEASONS)),
+            (lambda: list(info.get_cached_parents(mediatypes.MOVIESET).values()), L(M.MOVIESETS)),
             (lambda: quickjson.get_item_list(mediatypes.EPISODE), L(M.EPISODES)),
             (lambda: quickjson.get_item_list(mediatypes.MUSICVIDEO), L(M.MUSICVIDEOS))]
     elif medialist == 'music':
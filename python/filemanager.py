@@ -5,9 +5,10 @@ import xbmc
 import xbmcvfs
 from contextlib import closing
 
-from libs import mediainfo as info, mediatypes, pykodi, quickjson
+from libs import bandwidth, mediainfo as info, mediatypes, pykodi, quickjson, timing
 from libs.addonsettings import settings, EXISTING_FILE_IGNORE, EXISTING_FILE_OVERWRITE, EXISTING_FILE_USE_EXISTING
 from libs.pykodi import localize as L, log
+from libs import webhelper
 from libs.webhelper import Getter, GetterError
 
 CANT_CONTACT_PROVIDER = 32034
@@ -21,18 +22,21 @@ typemap = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif'}
 
 class FileManager(object):
     def __init__(self, bigcache=False):
-        self.getter = Getter()
+        self.getter = Getter(session=webhelper.get_shared_session(settings.pool_size))
         self.getter.session.headers['User-Agent'] = settings.useragent
+        self.connections_start = webhelper.connection_stats()
         self.size = 0
         self.fileerror_count = 0
         self.provider_errors = {}
+        # hostname: error count for the whole run, provider_errors resets after a success
+        self.host_errors = {}
         self.alreadycached = None if not bigcache else set()
         self.can_precache_specialimages = pykodi.get_kodi_version() >= 21
         self.extract_video_thumb = (
             self.can_precache_specialimages and
             bool(quickjson.get_settingvalue('myvideos.extractthumb')))
 
-    def downloadfor(self, mediaitem):
+    def downloadfor(self, mediaitem, playing=False):
         if self.fileerror_count >= FILEERROR_LIMIT:
             return False, ''
         if not info.can_saveartwork(mediaitem):
@@ -42,6 +46,12 @@ class FileManager(object):
             return False, ''
         services_hit = False
         error = ''
+        rate = bandwidth.current_rate(settings.bandwidth_day, settings.bandwidth_night,
+            settings.night_start, settings.night_end)
+        if playing and settings.bandwidth_playback:
+            # the playback limit only ever lowers the rate
+            rate = min(rate, settings.bandwidth_playback * 1024) if rate else settings.bandwidth_playback * 1024
+        bandwidth.limiter.set_rate(rate)
         for arttype, url in to_download.items():
             hostname = urlparse.urlparse(url).netloc
             if self.provider_errors.get(hostname, 0) >= PROVIDERERROR_LIMIT:
@@ -50,7 +60,9 @@ class FileManager(object):
             if not full_basefilepath:
                 continue
             test_basefilepath = full_basefilepath + '.' + get_test_extension(url)
-            if xbmcvfs.exists(test_basefilepath):
+            with timing.stage('exists'):
+                exists = xbmcvfs.exists(test_basefilepath)
+            if exists:
                 message = "Overwriting existing file '{0}' due to configuration" \
                         if settings.handle_existing_files == EXISTING_FILE_OVERWRITE \
                     else "Using existing file '{0}' due to configuration" \
@@ -62,34 +74,48 @@ class FileManager(object):
                 if settings.handle_existing_files == EXISTING_FILE_USE_EXISTING:
                     mediaitem.updatedart[arttype] = test_basefilepath
                     continue
+                with timing.stage('probe'):
+                    matches = settings.probe_existing_files and self.matches_existing(url, test_basefilepath)
+                if matches:
+                    log("Remote file matches existing file '{0}', not downloading".format(test_basefilepath))
+                    mediaitem.updatedart[arttype] = test_basefilepath
+                    continue
             else:
                 log("Kodi says this file does not exist\n" + test_basefilepath)
 
-            result, err = self.doget(url)
+            with timing.stage('http'):
+                result, err = self.doget(url, stream=True)
+            if result and not err:
+                with closing(result):
+                    ext = get_file_extension(result.headers.get('content-type'), url)
+                    # the body is streamed in, within the bandwidth limit
+                    with timing.stage('transfer'):
+                        content, err = self.readcontent(result, url) if ext else (None, None)
             if err:
                 error = err
                 self.provider_errors[hostname] = self.provider_errors.get(hostname, 0) + 1
+                self.host_errors[hostname] = self.host_errors.get(hostname, 0) + 1
                 continue
             else:
                 self.provider_errors[hostname] = 0
             if not result:
                 continue
-            self.size += int(result.headers.get('content-length', 0))
             services_hit = True
-            ext = get_file_extension(result.headers.get('content-type'), url)
             if not ext:
                 log("Can't determine extension for '{0}'\nfor image type '{1}'".format(url, arttype))
                 continue
+            self.size += len(content)
             full_basefilepath += '.' + ext
             folder = os.path.dirname(full_basefilepath)
             if not xbmcvfs.exists(folder):
                 xbmcvfs.mkdirs(folder)
-            file_ = xbmcvfs.File(full_basefilepath, 'wb')
-            with closing(file_):
-                if not file_.write(bytearray(result.content)):
-                    self.fileerror_count += 1
-                    raise FileError(L(CANT_WRITE_TO_FILE).format(full_basefilepath))
-                self.fileerror_count = 0
+            with timing.stage('write'):
+                file_ = xbmcvfs.File(full_basefilepath, 'wb')
+                with closing(file_):
+                    if not file_.write(content):
+                        self.fileerror_count += 1
+                        raise FileError(L(CANT_WRITE_TO_FILE).format(full_basefilepath))
+                    self.fileerror_count = 0
             mediaitem.updatedart[arttype] = full_basefilepath
             log("downloaded '{0}'\nto image file '{1}'".format(url, full_basefilepath))
         return services_hit, error
@@ -98,7 +124,7 @@ class FileManager(object):
         try:
             result = self.getter(url, **kwargs)
             if not result and url.startswith('http://'):
-                result, err = self.doget('https://' + url[7:])
+                result, err = self.doget('https://' + url[7:], **kwargs)
                 if err or not result:
                     result = None
             return result, None
@@ -110,6 +136,61 @@ class FileManager(object):
                 else L(HTTP_ERROR).format(ex.message) + '\n' + url
             return None, message
 
+    def readcontent(self, response, url):
+        try:
+            return webhelper.read_content(response, bandwidth.limiter), None
+        except GetterError as ex:
+            message = L(CANT_CONTACT_PROVIDER) if ex.connection_error \
+                else L(HTTP_ERROR).format(ex.message) + '\n' + url
+            return None, message
+
+    def matches_existing(self, url, existingfile):
+        '''Check the remote size and type against an existing file without downloading the whole image.'''
+        size = xbmcvfs.Stat(existingfile).st_size()
+        if not size:
+            return False
+        contentlength, contenttype = self.probe(url)
+        if contentlength != size:
+            return False
+        return get_file_extension(contenttype, url) == existingfile.rsplit('.', 1)[1]
+
+    def probe(self, url):
+        '''Get remote Content-Length and Content-Type with a HEAD request,
+        or a ranged GET of the first byte for servers that don't handle HEAD.'''
+        try:
+            result = self.getter.head(url)
+            if result is not None and result.headers.get('content-length'):
+                return int(result.headers['content-length']), result.headers.get('content-type')
+        except (GetterError, ValueError):
+            pass
+        try:
+            result = self.getter(url, headers={'Range': 'bytes=0-0'}, stream=True)
+        except GetterError:
+            return None, None
+        if result is None:
+            return None, None
+        with closing(result):
+            contentrange = result.headers.get('content-range', '')
+            if result.status_code != 206 or '/' not in contentrange:
+                return None, None
+            total = contentrange.rsplit('/', 1)[1]
+            if not total.isdigit():
+                return None, None
+            return int(total), result.headers.get('content-type')
+
+    def log_connection_stats(self):
+        '''Log connection reuse for each host during this run.'''
+        lines = []
+        for host, (requests, connections) in sorted(webhelper.connection_stats().items()):
+            startrequests, startconnections = self.connections_start.get(host, (0, 0))
+            requests -= startrequests
+            connections -= startconnections
+            if requests > 0:
+                lines.append("{0}: {1} requests, {2} new connections, {3} reused".format(
+                    host, requests, connections, requests - connections))
+        if lines:
+            log("Connection pools\n" + '\n'.join(lines))
+
     def set_bigcache(self):
         if self.alreadycached is None:
             self.alreadycached = set()
@@ -120,8 +201,9 @@ class FileManager(object):
             return 0
         if self.alreadycached is not None:
             if not self.alreadycached:
-                self.alreadycached = set(pykodi.unquoteimage(texture['url']) for texture in quickjson.get_textures()
-                    if not pykodi.unquoteimage(texture['url']).startswith('http'))
+                self.alreadycached = set(url for url in
+                    (pykodi.unquoteimage(texture['url']) for texture in quickjson.get_textures())
+                    if not url.startswith('http'))
             alreadycached = self.alreadycached
         else:
             alreadycached = set(pykodi.unquoteimage(texture['url']) for texture in quickjson.get_textures(urls))
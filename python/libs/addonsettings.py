@@ -1,7 +1,9 @@
 import xbmc
 import xbmcaddon
+from types import MappingProxyType
 
 from libs import pykodi
+from libs.utils import PathMatcher
 
 PROGRESS_DISPLAY_FULLPROGRESS = 0
 PROGRESS_DISPLAY_WARNINGSERRORS = 1
@@ -19,42 +21,136 @@ SCAN_NEW_ALL = 0
 SCAN_NEW_DAYS = 1
 SCAN_NEW_DATABASE = 2
 
+# setting ID: type for xbmcaddon.Addon.getSetting*, settings for both Settings and mediatypes
+SETTING_TYPES = {
+    'enableservice': 'Bool',
+    'enableservice_music': 'Bool',
+    'progress_display': 'Int',
+    'final_notification': 'Bool',
+    'handle_existing_files': 'Int',
+    'probe_existing_files': 'Bool',
+    'savewith_basefilename': 'Bool',
+    'savewith_basefilename_mvids': 'Bool',
+    'cache_local_video_artwork': 'Bool',
+    'cache_local_music_artwork': 'Bool',
+    'max_multiple_fanart': 'Int',
+    'determine_new_algo': 'Int',
+    'update_debounce': 'Number',
+    'playback_pause': 'Number',
+    'log_timing': 'Bool',
+    'profile_jsonrpc': 'Bool',
+    'write_metrics': 'Bool',
+    'metrics_textfile_path': 'String',
+    'profile_memory': 'Bool',
+    'profile_memory_interval': 'Int',
+    'last_music_run': 'String',
+    'last_video_run': 'String',
+    'share_work': 'Bool',
+    'share_path': 'String',
+    'share_clientid': 'String',
+    'pool_size': 'Int',
+    'bandwidth_day': 'Int',
+    'bandwidth_night': 'Int',
+    'night_start': 'Int',
+    'night_end': 'Int',
+    'bandwidth_playback': 'Int',
+    'managed_mediatypes': '',
+    'multiple_fanart_mediatypes': '',
+    'video_download_level': 'Int',
+    'music_download_level': 'Int',
+    'movie.thumb_generate': 'Bool',
+    'episode.thumb_generate': 'Bool',
+    'musicvideo.thumb_generate': 'Bool',
+    'movieart_downloadlist': '',
+    'tvshowart_downloadlist': '',
+    'episodeart_downloadlist': '',
+    'musicvideoart_downloadlist': '',
+    'artistart_downloadlist': '',
+    'albumart_downloadlist': '',
+    'songart_downloadlist': ''
+}
+
+def read_snapshot():
+    '''Read all add-on settings from Kodi in one pass. The result is read-only and shared
+    by Settings and mediatypes, so each can tell what changed since the last one.'''
+    addon = xbmcaddon.Addon()
+    values = dict((settingid, getattr(addon, 'getSetting' + settingtype)(settingid))
+        for settingid, settingtype in SETTING_TYPES.items())
+    values['profile'] = addon.getAddonInfo('profile')
+
+    folders = []
+    prefixes = []
+    regexes = []
+    for index in range(10):
+        index_append = str(index+1)
+        option = addon.getSettingBool('exclude.path.option_' + index_append)
+        if option:
+            exclusiontype = addon.getSettingInt('exclude.path.type_' + index_append)
+            if exclusiontype == EXCLUSION_PATH_TYPE_FOLDER:
+                folders.append(addon.getSettingString('exclude.path.folder_' + index_append))
+            elif exclusiontype == EXCLUSION_PATH_TYPE_PREFIX:
+                prefixes.append(addon.getSettingString('exclude.path.prefix_' + index_append))
+            elif exclusiontype == EXCLUSION_PATH_TYPE_REGEX:
+                regexes.append(addon.getSettingString('exclude.path.regex_' + index_append))
+    values['exclusions'] = (tuple(folders), tuple(prefixes), tuple(regexes))
+    return MappingProxyType(values)
+
 class Settings(object):
-    def __init__(self):
+    '''Add-on settings, read from Kodi when one is first used rather than at import.'''
+    def __getattr__(self, name):
+        # only called for attributes not set yet
+        if name.startswith('_') or self.__dict__.get('loaded'):
+            raise AttributeError(name)
         self.update_settings()
-        self.update_useragent()
+        return getattr(self, name)
 
     def update_useragent(self):
         addonversion = xbmcaddon.Addon().getAddonInfo('version')
         self.useragent = 'ArtworkDump/{0} '.format(addonversion) + xbmc.getUserAgent()
 
     def update_settings(self):
-        addon = xbmcaddon.Addon()
-        self.datapath = addon.getAddonInfo('profile')
-        self.enableservice = addon.getSettingBool('enableservice')
-        self.enableservice_music = addon.getSettingBool('enableservice_music')
-        self.progressdisplay = addon.getSettingInt('progress_display')
-        self.final_notification = addon.getSettingBool('final_notification')
-        self.handle_existing_files = addon.getSettingInt('handle_existing_files')
-        self.savewith_basefilename = addon.getSettingBool('savewith_basefilename')
-        self.savewith_basefilename_mvids = addon.getSettingBool('savewith_basefilename_mvids')
-        self.cache_local_video_artwork = addon.getSettingBool('cache_local_video_artwork')
-        self.cache_local_music_artwork = addon.getSettingBool('cache_local_music_artwork')
-        self.max_multiple_fanart = addon.getSettingInt('max_multiple_fanart')
-        self.determine_new_algo = addon.getSettingInt('determine_new_algo')
-        self.last_music_run = addon.getSettingString('last_music_run')
-        self.last_video_run = addon.getSettingString('last_video_run')
-
-        self.pathexclusion = []
-        for index in range(10):
-            index_append = str(index+1)
-            option = addon.getSettingBool('exclude.path.option_' + index_append)
-            if option:
-                exclusiontype = addon.getSettingInt('exclude.path.type_' + index_append)
-                folder = addon.getSettingString('exclude.path.folder_' + index_append)
-                prefix = addon.getSettingString('exclude.path.prefix_' + index_append)
-                regex = addon.getSettingString('exclude.path.regex_' + index_append)
-                self.pathexclusion.append({"type": exclusiontype, "folder": folder, "prefix": prefix, "regex": regex})
+        snapshot = read_snapshot()
+        if not self.__dict__.get('loaded'):
+            self.update_useragent()
+        self.loaded = True
+        self.snapshot = snapshot
+        self.datapath = snapshot['profile']
+        self.enableservice = snapshot['enableservice']
+        self.enableservice_music = snapshot['enableservice_music']
+        self.progressdisplay = snapshot['progress_display']
+        self.final_notification = snapshot['final_notification']
+        self.handle_existing_files = snapshot['handle_existing_files']
+        self.probe_existing_files = snapshot['probe_existing_files']
+        self.savewith_basefilename = snapshot['savewith_basefilename']
+        self.savewith_basefilename_mvids = snapshot['savewith_basefilename_mvids']
+        self.cache_local_video_artwork = snapshot['cache_local_video_artwork']
+        self.cache_local_music_artwork = snapshot['cache_local_music_artwork']
+        self.max_multiple_fanart = snapshot['max_multiple_fanart']
+        self.determine_new_algo = snapshot['determine_new_algo']
+        self.update_debounce = snapshot['update_debounce']
+        self.playback_pause = snapshot['playback_pause']
+        self.log_timing = snapshot['log_timing']
+        self.profile_jsonrpc = snapshot['profile_jsonrpc']
+        self.write_metrics = snapshot['write_metrics']
+        self.metrics_textfile_path = snapshot['metrics_textfile_path']
+        self.profile_memory = snapshot['profile_memory']
+        self.profile_memory_interval = snapshot['profile_memory_interval']
+        self.last_music_run = snapshot['last_music_run']
+        self.last_video_run = snapshot['last_video_run']
+        self.share_work = snapshot['share_work']
+        self.share_path = snapshot['share_path']
+        self.share_clientid = snapshot['share_clientid']
+        self.pool_size = snapshot['pool_size']
+        self.bandwidth_day = snapshot['bandwidth_day']
+        self.bandwidth_night = snapshot['bandwidth_night']
+        self.night_start = snapshot['night_start']
+        self.night_end = snapshot['night_end']
+        self.bandwidth_playback = snapshot['bandwidth_playback']
+
+        exclusions = snapshot['exclusions']
+        if exclusions != self.__dict__.get('_exclusions'):
+            self._exclusions = exclusions
+            self.pathexclusion = PathMatcher(*exclusions)
 
     def set_last_video_run(self, last_run):
         addon = xbmcaddon.Addon()
@@ -64,4 +160,9 @@ class Settings(object):
         addon = xbmcaddon.Addon()
         addon.setSetting('last_music_run', last_run)
 
+    def set_share_clientid(self, clientid):
+        addon = xbmcaddon.Addon()
+        addon.setSetting('share_clientid', clientid)
+        self.share_clientid = clientid
+
 settings = Settings()
@@ -0,0 +1,61 @@
+import threading
+import time
+from datetime import datetime
+
+MAX_CHUNK_SIZE = 64 * 1024
+MIN_CHUNK_SIZE = 1024
+
+class BandwidthLimiter(object):
+    '''Token bucket shared by every download in the process. Each chunk is counted as it is read,
+    so the rate holds through a transfer rather than being made up between files.'''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rate = 0
+        self.allowance = 0.0
+        self.last = time.monotonic()
+
+    def set_rate(self, rate):
+        '''Bytes per second, 0 for no limit.'''
+        with self.lock:
+            if rate != self.rate:
+                self.rate = rate
+                self.allowance = 0.0
+                self.last = time.monotonic()
+
+    @property
+    def chunk_size(self):
+        # small enough that a slow limit still waits often, for a steady rate
+        if not self.rate:
+            return MAX_CHUNK_SIZE
+        return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, self.rate // 4))
+
+    def consume(self, size):
+        '''Wait until `size` more bytes fit in the current rate.'''
+        with self.lock:
+            if not self.rate:
+                return
+            now = time.monotonic()
+            # allow a burst of up to one second after an idle period
+            self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+            self.last = now
+            # take the bytes now, later callers wait behind this one
+            self.allowance -= size
+            wait = -self.allowance / self.rate if self.allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+def current_rate(daylimit, nightlimit, nightstart, nightend, now=None):
+    '''Limit in bytes per second for the time of day, from limits in KB/s and night hours.
+    With no night limit the day limit applies all day.'''
+    if not nightlimit:
+        return daylimit * 1024
+    hour = (now or datetime.now()).hour
+    if nightstart == nightend:
+        night = False
+    elif nightstart < nightend:
+        night = nightstart <= hour < nightend
+    else:
+        night = hour >= nightstart or hour < nightend
+    return (nightlimit if night else daylimit) * 1024
+
+limiter = BandwidthLimiter()
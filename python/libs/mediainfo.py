@@ -1,13 +1,15 @@
+import hashlib
 import os
-import re
 import xbmc
 import xbmcvfs
+from collections import namedtuple
 from functools import wraps
-from urllib.parse import quote, unquote
+from urllib.parse import unquote
 
 from libs import mediatypes, pykodi, quickjson, utils
 from libs.addonsettings import settings
 from libs.mediatypes import _split_arttype as split_arttype
+from libs.processeditems import AvailableArt
 from libs.pykodi import log, unquoteimage, localize as L
 from libs.quickjson import JSONException
 
@@ -22,11 +24,23 @@ idmap = (('episodeid', mediatypes.EPISODE),
     ('albumid', mediatypes.ALBUM),
     ('artistid', mediatypes.ARTIST))
 
+MediaItemKey = namedtuple('MediaItemKey', ['dbid', 'mediatype', 'label'])
+
+def get_item_key(jsondata):
+    '''Just enough of a library item to filter it before building a full `MediaItem`.'''
+    mediatype, dbid = get_mediatype_id(jsondata)
+    return MediaItemKey(dbid, mediatype, build_label(jsondata, mediatype))
+
 class MediaItem(object):
-    def __init__(self, jsondata):
-        self.label = jsondata['label']
+    __slots__ = ('label', 'file', 'mediatype', 'dbid', 'art', 'uniqueids', 'tvshowid', 'showtitle', 'season',
+        'episode', 'albumid', 'artistid', 'artist', 'album', 'discfolders', 'updatedart', 'error',
+        'missingid', 'borked_filename')
+
+    def __init__(self, jsondata, key: MediaItemKey=None):
+        if key is None:
+            key = get_item_key(jsondata)
+        self.dbid, self.mediatype, self.label = key
         self.file = unquotearchive(jsondata.get('file'))
-        self.mediatype, self.dbid = get_mediatype_id(jsondata)
 
         self.art = get_own_artwork(jsondata)
         self.uniqueids = _get_uniqueids(jsondata, self.mediatype)
@@ -34,7 +48,6 @@ class MediaItem(object):
             self.tvshowid = jsondata['tvshowid']
             self.showtitle = jsondata['showtitle']
             self.season = jsondata['season']
-            self.label = self.showtitle + ' - ' + self.label
         if self.mediatype == mediatypes.EPISODE:
             self.episode = jsondata['episode']
         elif self.mediatype == mediatypes.TVSHOW:
@@ -43,12 +56,9 @@ class MediaItem(object):
             if mediatypes.central_directories[mediatypes.MOVIESET]:
                 self.file = mediatypes.central_directories[mediatypes.MOVIESET] \
                     + utils.path_component(self.label) + '.ext'
-        elif self.mediatype == mediatypes.MUSICVIDEO:
-            self.label = build_music_label(jsondata)
         elif self.mediatype in mediatypes.audiotypes:
             if self.mediatype in (mediatypes.ALBUM, mediatypes.SONG):
                 self.albumid = jsondata['albumid']
-                self.label = build_music_label(jsondata)
             self.artistid = None if self.mediatype == mediatypes.ARTIST \
                 else jsondata['albumartistid'][0] if jsondata.get('albumartistid') \
                 else jsondata['artistid'][0] if jsondata.get('artistid') \
@@ -74,6 +84,13 @@ def unquotearchive(filepath):
     result = filepath[6:].split('/', 1)[0]
     return unquote(result)
 
+def build_label(jsondata, mediatype):
+    if mediatype in (mediatypes.EPISODE, mediatypes.SEASON):
+        return jsondata['showtitle'] + ' - ' + jsondata['label']
+    if mediatype in (mediatypes.MUSICVIDEO, mediatypes.ALBUM, mediatypes.SONG):
+        return build_music_label(jsondata)
+    return jsondata['label']
+
 def build_music_label(jsondata):
     return jsondata['artist'][0] + ' - ' + jsondata['title'] if jsondata.get('artist') else jsondata['title']
 
@@ -90,7 +107,7 @@ def get_own_artwork(jsondata):
     _remove_bad_icon(result)
     return result
 
-def _get_multiple_fanart(existingart, dbid, mediatype):
+def _get_multiple_fanart(existingart, dbid, mediatype, readonly=False):
     if settings.max_multiple_fanart == 0:
         return existingart
     maxindex = _get_max_assigned_fanart(existingart)
@@ -98,15 +115,14 @@ def _get_multiple_fanart(existingart, dbid, mediatype):
         # "multiple fanart" already managed for this item, don't guess and gather dupes
         return existingart
 
-    existing_fanarturls = set(url for arttype, url in existingart.items() if split_arttype(arttype)[0] == 'fanart')
+    existing_fanarturls = _get_fanart_urls(existingart)
     try:
-        availableart = quickjson.get_available_art(dbid, mediatype, 'fanart')
+        availableart = _get_available_fanart(dbid, mediatype, existing_fanarturls, readonly)
         if len(availableart) <= maxindex + 1:
             return existingart # if we already have more than available, assume these are dupes
 
         toadd_urls = []
-        for art_option in availableart:
-            url = unquoteimage(art_option['url'])
+        for url in availableart:
             if url not in existing_fanarturls and url not in toadd_urls:
                 toadd_urls.append(url)
 
@@ -124,6 +140,72 @@ def _get_multiple_fanart(existingart, dbid, mediatype):
 
     return existingart
 
+def _get_available_fanart(dbid, mediatype, existing_fanarturls, readonly=False):
+    arthash = _hash_urls(existing_fanarturls)
+    prefetched = _prefetched_fanart.pop((mediatype, dbid), None)
+    if prefetched:
+        urls, fromrecord = prefetched
+        if fromrecord:
+            return urls
+    else:
+        urls = get_availableart_record().get_urls(dbid, mediatype, arthash, settings.max_multiple_fanart)
+        if urls is not None:
+            return urls
+        urls = [unquoteimage(art['url']) for art in quickjson.get_available_art(dbid, mediatype, 'fanart')]
+    if not readonly:
+        get_availableart_record().set_urls(dbid, mediatype, arthash, settings.max_multiple_fanart, urls)
+    return urls
+
+def prefetch_multiple_fanart(mediaitems):
+    '''Get available fanart for upcoming items in one batch request, ahead of `add_additional_iteminfo`.
+    Also writes the available fanart recorded for the last batch.'''
+    if _availableart_record:
+        _availableart_record.commit()
+    if settings.max_multiple_fanart == 0:
+        return
+    record = get_availableart_record()
+    toquery = []
+    for mediaitem in mediaitems:
+        if not mediatypes.add_multipleart(mediaitem.mediatype) or _get_max_assigned_fanart(mediaitem.art) >= 1:
+            continue
+        arthash = _hash_urls(_get_fanart_urls(mediaitem.art))
+        urls = record.get_urls(mediaitem.dbid, mediaitem.mediatype, arthash, settings.max_multiple_fanart)
+        if urls is not None:
+            _prefetched_fanart[(mediaitem.mediatype, mediaitem.dbid)] = (urls, True)
+        else:
+            toquery.append((mediaitem.dbid, mediaitem.mediatype))
+    if len(toquery) < 2:
+        return # a single item is fetched as usual
+
+    for (dbid, mediatype), availableart in quickjson.get_available_art_batch(toquery, 'fanart').items():
+        urls = [unquoteimage(art['url']) for art in availableart]
+        _prefetched_fanart[(mediatype, dbid)] = (urls, False)
+
+def _get_fanart_urls(existingart):
+    return set(url for arttype, url in existingart.items() if split_arttype(arttype)[0] == 'fanart')
+
+def _hash_urls(urls):
+    return hashlib.md5('\n'.join(sorted(urls)).encode('utf-8', 'backslashreplace')).hexdigest()
+
+_prefetched_fanart = {}
+
+_availableart_record = None
+def get_availableart_record():
+    global _availableart_record
+    if not _availableart_record:
+        _availableart_record = AvailableArt()
+    return _availableart_record
+
+def prune_availableart(mediatype):
+    '''Remove available fanart recorded for items no longer in the library, after a pass over all of it.
+    This also covers items removed by other clients of a shared library.'''
+    if not mediatypes.add_multipleart(mediatype):
+        return
+    keylist = quickjson.iter_item_keylist(mediatype)[0]
+    removed = get_availableart_record().prune(mediatype, set(get_item_key(item).dbid for item in keylist))
+    if removed:
+        log("Removed available fanart of {0} {1}s no longer in the library".format(removed, mediatype))
+
 def _get_max_assigned_fanart(existingart):
     maxindex = -1
     for arttype in existingart:
@@ -156,13 +238,11 @@ def build_video_thumbnail_path(videofile_path):
     path = utils.get_movie_thumb_path(videofile_path)
     if path.endswith('.iso'):
         return None
-    # Kodi goes lowercase and doesn't encode some chars
-    result = 'image://video@{0}/'.format(quote(path, '()!'))
-    result = re.sub(r'%[0-9A-F]{2}', lambda mo: mo.group().lower(), result)
-    return result
+    return 'image://video@{0}/'.format(pykodi.quote_imagepath(path))
 
-def add_additional_iteminfo(mediaitem: MediaItem):
-    '''Get more data from the Kodi library.'''
+def add_additional_iteminfo(mediaitem: MediaItem, readonly=False):
+    '''Get more data from the Kodi library. `readonly` leaves the add-on's own records as they are,
+    for a dry run.'''
     if mediaitem.mediatype == mediatypes.SEASON:
         tvshow = get_cached_tvshow(mediaitem.tvshowid)
         mediaitem.file = tvshow['file']
@@ -172,21 +252,30 @@ def add_additional_iteminfo(mediaitem: MediaItem):
             mediaitem.file, mediaitem.discfolders = folders
 
     if mediatypes.add_multipleart(mediaitem.mediatype):
-        mediaitem.art = _get_multiple_fanart(mediaitem.art, mediaitem.dbid, mediaitem.mediatype)
+        mediaitem.art = _get_multiple_fanart(mediaitem.art, mediaitem.dbid, mediaitem.mediatype, readonly)
 
 def _identify_album_folders(mediaitem):
-    songs = get_cached_songs(mediaitem.albumid)
-    folders = set(os.path.dirname(song['file']) for song in songs)
+    songindex = get_cached_songindex() if bulk_lookups else None
+    if songindex and mediaitem.albumid not in songindex.albumfolders:
+        # added to the library after the index was built
+        songindex = None
+    if songindex:
+        albumfolders = songindex.albumfolders.get(mediaitem.albumid, {})
+        folders = set(albumfolders)
+    else:
+        songs = get_cached_songs(mediaitem.albumid)
+        folders = set(os.path.dirname(song['file']) for song in songs)
     if len(folders) == 1: # all songs only in one folder
         folder = folders.pop()
-        if not _shared_albumfolder(folder):
+        if not _shared_albumfolder(folder, songindex):
             return folder + utils.get_pathsep(folder), {}
     elif len(folders) > 1: # split to multiple folders
         discs = {}
         for folder in folders:
-            if _shared_albumfolder(folder):
+            if _shared_albumfolder(folder, songindex):
                 return
-            discnum = next(s['disc'] for s in songs if os.path.dirname(s['file']) == folder)
+            discnum = albumfolders[folder] if songindex \
+                else next(s['disc'] for s in songs if os.path.dirname(s['file']) == folder)
             if discnum:
                 discs[discnum] = folder + utils.get_pathsep(folder)
         # `os.path.commonpath` clobbers some paths
@@ -196,11 +285,25 @@ def _identify_album_folders(mediaitem):
         if commonpath or discs:
             return commonpath, discs
 
-def _shared_albumfolder(folder):
+def _shared_albumfolder(folder, songindex=None):
+    if songindex:
+        return len(songindex.folderalbums.get(folder, ())) > 1
     songs = get_cached_songs_bypath(folder + utils.get_pathsep(folder))
     albums = set(song['albumid'] for song in songs)
     return len(albums) > 1
 
+class SongIndex(object):
+    '''Album folders for the whole music library, built from one pass over all songs.'''
+    def __init__(self, songs):
+        # albumid: {folder: disc number of the first song in that folder}
+        self.albumfolders = {}
+        # folder: set of albumids with songs in that folder
+        self.folderalbums = {}
+        for song in songs:
+            folder = os.path.dirname(song['file'])
+            self.albumfolders.setdefault(song['albumid'], {}).setdefault(folder, song['disc'])
+            self.folderalbums.setdefault(folder, set()).add(song['albumid'])
+
 def _get_uniqueids(jsondata, mediatype):
     uniqueids = {}
     for uid in jsondata.get('uniqueid', {}):
@@ -275,6 +378,15 @@ def build_artwork_basepath(mediaitem, arttype):
     return path
 
 def find_central_infodir(mediaitem):
+    # build_artwork_basepath runs for each art type of the same item in turn
+    global _last_central_infodir
+    if _last_central_infodir[0] is not mediaitem:
+        _last_central_infodir = (mediaitem, _find_central_infodir(mediaitem))
+    return _last_central_infodir[1]
+
+_last_central_infodir = (None, None)
+
+def _find_central_infodir(mediaitem):
     # WARN: Yikes, this code is gross
     fromtv = mediaitem.mediatype in (mediatypes.SEASON, mediatypes.EPISODE)
     fromartist = mediaitem.mediatype == mediatypes.ARTIST
@@ -308,16 +420,17 @@ def find_central_infodir(mediaitem):
     return result
 
 def _find_existing(basedir, name, uniqueslug=None, mediayear=None, files=False):
-    for item in get_cached_listdir(basedir)[1 if files else 0]:
-        cleantitle, diryear = xbmc.getCleanMovieTitle(item) if mediayear else (item, '')
-        if diryear and int(diryear) != mediayear:
-            continue
-        if files:
-            item = item.rsplit('-', 1)[0]
-        for title in utils.iter_possible_cleannames(name, uniqueslug):
-            if title in (cleantitle, item):
-                return item
-    return None
+    nameindex = get_cached_nameindex(basedir, files, bool(mediayear))
+    found = None
+    for title in utils.iter_possible_cleannames(name, uniqueslug):
+        for position, item, diryear in nameindex.get(title, ()):
+            if diryear and diryear != mediayear:
+                continue
+            # keep the first matching entry in directory order
+            if found is None or position < found[0]:
+                found = (position, item)
+            break
+    return found[1] if found else None
 
 def _get_uniqueslug(mediaitem, slug_mediatype):
     if slug_mediatype == mediatypes.ARTIST and mediaitem.artist is not None:
@@ -348,6 +461,19 @@ def cacheit(func):
 def get_cached_listdir(path):
     return xbmcvfs.listdir(path)
 
+@cacheit
+def get_cached_nameindex(path, files, withyear):
+    '''Map clean titles and entry names in a directory listing to (position, entry, year).'''
+    result = {}
+    for position, item in enumerate(get_cached_listdir(path)[1 if files else 0]):
+        cleantitle, diryear = xbmc.getCleanMovieTitle(item) if withyear else (item, '')
+        diryear = int(diryear) if diryear else None
+        if files:
+            item = item.rsplit('-', 1)[0]
+        for key in set((cleantitle, item)):
+            result.setdefault(key, []).append((position, item, diryear))
+    return result
+
 @cacheit
 def get_cached_artists(artistname):
     return quickjson.get_artists_byname(artistname)
@@ -360,18 +486,45 @@ def get_cached_albums(artistname, dbid):
 def get_cached_songs(dbid):
     return quickjson.get_songs(mediatypes.ALBUM, dbid)
 
+@cacheit
+def get_cached_songindex():
+    return SongIndex(quickjson.iter_item_list(mediatypes.SONG, ['albumid', 'file', 'disc'])[0])
+
 @cacheit
 def get_cached_songs_bypath(path):
     return quickjson.get_songs(songfilter={'field': 'path', 'operator': 'is', 'value': path})
 
 def get_cached_tvshow(dbid):
-    tvshows = get_cached_tvshows()
-    return next(show for show in tvshows if show['tvshowid'] == dbid)
+    return get_cached_parent(mediatypes.TVSHOW, dbid)
+
+def get_cached_parent(mediatype, dbid):
+    '''Get a parent item like a TV show, season, or album by dbid, from the full listing for big runs.'''
+    # the TV show list is always small enough to list fully, and seasons need it anyway
+    if bulk_lookups or mediatype == mediatypes.TVSHOW:
+        result = get_cached_parents(mediatype).get(dbid)
+        if result:
+            return result
+    return get_cached_item_details(dbid, mediatype)
+
+@cacheit
+def get_cached_parents(mediatype):
+    return dict((item[mediatype + 'id'], item) for item in quickjson.get_item_list(mediatype))
 
 @cacheit
-def get_cached_tvshows():
-    return quickjson.get_item_list(mediatypes.TVSHOW)
+def get_cached_item_details(dbid, mediatype):
+    return quickjson.get_item_details(dbid, mediatype)
 
 quickcache = {}
 def clear_cache():
+    global _last_central_infodir
     quickcache.clear()
+    _prefetched_fanart.clear()
+    if _availableart_record:
+        _availableart_record.commit()
+    _last_central_infodir = (None, None)
+
+# Build whole-library indexes instead of querying per item, worth it for big lists
+bulk_lookups = False
+def set_bulk_lookups(enabled):
+    global bulk_lookups
+    bulk_lookups = enabled
@@ -1,4 +1,4 @@
-from libs import pykodi
+from libs.addonsettings import settings
 
 TVSHOW = 'tvshow'
 MOVIE = 'movie'
@@ -16,8 +16,6 @@ SETTING_DOWNLOAD_ALL = 0
 SETTING_DOWNLOAD_NONE = 1
 SETTING_DOWNLOAD_CUSTOM = 2
 
-addon = pykodi.get_main_addon()
-
 _default_mediatypes = {
     TVSHOW: ['poster', 'keyart', 'fanart', 'banner', 'clearlogo', 'landscape', 'clearart', 'characterart'],
     MOVIE: ['poster', 'keyart', 'fanart', 'banner', 'clearlogo', 'landscape', 'clearart', 'discart', 'characterart', 'animatedposter', 'animatedkeyart', 'animatedfanart'],
@@ -49,14 +47,27 @@ _togenerate = dict((mediatype, False) for mediatype in (MOVIE, EPISODE, MUSICVID
 _download_all = list(_default_mediatypes.keys())
 _managed_mediatypes = list(_default_mediatypes.keys())
 _multiplefanart_mediatypes = list(_default_mediatypes.keys())
+# settings are read when first needed rather than at import
+_settings_loaded = False
+# the settings the lists above are built from, and their values when last built
+_source_settings = ('managed_mediatypes', 'multiple_fanart_mediatypes', 'video_download_level',
+    'music_download_level') + tuple(mtype + '.thumb_generate' for mtype in _togenerate) \
+    + tuple(sorted(set(_mediatype_settings.values())))
+_source_values = None
 
 def disabled(mediatype):
+    if not _settings_loaded:
+        update_settings()
     return mediatype not in _managed_mediatypes
 
 def add_multipleart(mediatype):
+    if not _settings_loaded:
+        update_settings()
     return mediatype in _multiplefanart_mediatypes
 
 def downloadartwork(mediatype, arttype):
+    if not _settings_loaded:
+        update_settings()
     if mediatype in _download_all:
         return True
     arttype, _ = _split_arttype(arttype)
@@ -68,19 +79,30 @@ def _split_arttype(arttype):
     return basetype, idx
 
 def generatethumb(mediatype):
+    if not _settings_loaded:
+        update_settings()
     return _togenerate.get(mediatype, False)
 
 def update_settings():
+    '''Rebuild the lists from the shared settings snapshot, only if the settings they come from changed.'''
+    global _settings_loaded, _source_values
+    _settings_loaded = True
+    snapshot = settings.snapshot
+    source_values = tuple(snapshot[settingid] for settingid in _source_settings)
+    if source_values == _source_values:
+        return
+    _source_values = source_values
+
     global _managed_mediatypes
-    _managed_mediatypes = _get_setting_list('managed_mediatypes')
+    _managed_mediatypes = _get_setting_list(snapshot, 'managed_mediatypes')
     global _multiplefanart_mediatypes
-    _multiplefanart_mediatypes = _get_setting_list('multiple_fanart_mediatypes')
+    _multiplefanart_mediatypes = _get_setting_list(snapshot, 'multiple_fanart_mediatypes')
 
     for mtype in _togenerate:
-        _togenerate[mtype] = addon.getSettingBool(mtype + '.thumb_generate')
+        _togenerate[mtype] = snapshot[mtype + '.thumb_generate']
 
-    videosetting = addon.getSettingInt('video_download_level')
-    audiosetting = addon.getSettingInt('music_download_level')
+    videosetting = snapshot['video_download_level']
+    audiosetting = snapshot['music_download_level']
 
     global _download_all
     _download_all = []
@@ -97,14 +119,12 @@ def update_settings():
 
     for mtype in _default_mediatypes:
         if mtype in _download_all or mtype in download_none:
-            _download_arttypes[mtype] == []
+            _download_arttypes[mtype] = []
         else:
-            _download_arttypes[mtype] = _get_setting_list(_mediatype_settings[mtype])
+            _download_arttypes[mtype] = _get_setting_list(snapshot, _mediatype_settings[mtype])
 
-def _get_setting_list(setting_name):
-    result = addon.getSetting(setting_name).split(', ')
+def _get_setting_list(snapshot, setting_name):
+    result = snapshot[setting_name].split(', ')
     if len(result) == 1 and result[0] == '':
        return []
     return result
-
-update_settings()
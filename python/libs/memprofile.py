@@ -0,0 +1,71 @@
+import tracemalloc
+import xbmc
+
+from .pykodi import log
+
+TRACE_FRAMES = 4
+TOP_SITES = 15
+
+# name: function returning the current size of a cache or collection that may grow through a run
+_sizes = {}
+_baseline = None
+_started_tracing = False
+_interval = 0
+_count = 0
+
+def watch(name, size_fn):
+    _sizes[name] = size_fn
+
+def unwatch(name):
+    _sizes.pop(name, None)
+
+def start(enabled, interval):
+    global _baseline, _started_tracing, _interval, _count
+    if not enabled:
+        return
+    _interval = interval
+    _count = 0
+    _started_tracing = not tracemalloc.is_tracing()
+    if _started_tracing:
+        tracemalloc.start(TRACE_FRAMES)
+    _baseline = _take_snapshot()
+    log_snapshot("run start")
+
+def tick():
+    '''Count a processed item, logging a snapshot every `interval` items.'''
+    global _count
+    if _baseline is None:
+        return
+    _count += 1
+    if _interval and not _count % _interval:
+        log_snapshot("{0} items".format(_count))
+
+def log_snapshot(when):
+    '''Log the top allocation sites since the start of the run and the size of each watched cache.'''
+    if _baseline is None:
+        return
+    snapshot = _take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    lines = ["Memory at {0}: {1:.1f} MB traced, {2:.1f} MB peak".format(when, current / 1048576, peak / 1048576)]
+    for name, size_fn in sorted(_sizes.items()):
+        try:
+            lines.append("  {0}: {1} entries".format(name, size_fn()))
+        except TypeError:
+            pass
+    lines.append("Top allocation sites since the start of the run")
+    for stat in snapshot.compare_to(_baseline, 'lineno')[:TOP_SITES]:
+        lines.append("  " + str(stat))
+    log('\n'.join(lines), xbmc.LOGINFO)
+
+def _take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+def stop():
+    global _baseline, _started_tracing
+    if _baseline is None:
+        return
+    log_snapshot("run finish")
+    _baseline = None
+    if _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
@@ -1,3 +1,4 @@
+import json
 import sqlite3
 import xbmcvfs
 
@@ -5,6 +6,7 @@ from .addonsettings import settings
 from .pykodi import check_utf8
 
 VERSION = 0
+AVAILABLEART_VERSION = 0
 
 class ProcessedItems(object):
     def __init__(self, skipdb: bool):
@@ -62,6 +64,62 @@ def upgrade_processeditems(db, fromversion):
 
     return workingversion
 
+class AvailableArt(object):
+    '''Available art from Kodi for each item, to skip asking again while the item's art is unchanged.
+    New rows are kept until `commit`, to write them together for each batch of items.'''
+    def __init__(self):
+        self.db = Database('availableart', upgrade_availableart)
+        # (mediaid, mediatype): (arthash, maxcount, urls)
+        self.pending = {}
+
+    def get_urls(self, mediaid, mediatype, arthash, maxcount):
+        if self.db.error:
+            return None
+        pending = self.pending.get((mediaid, mediatype))
+        if pending:
+            return pending[2] if pending[:2] == (arthash, maxcount) else None
+        result = self.db.fetchone("""SELECT urls FROM availableart WHERE mediaid=? AND mediatype=?
+            AND arthash=? AND maxcount=?""", (mediaid, mediatype, arthash, maxcount))
+        if result:
+            return json.loads(result['urls'])
+
+    def set_urls(self, mediaid, mediatype, arthash, maxcount, urls):
+        if self.db.error:
+            return
+        self.pending[(mediaid, mediatype)] = (arthash, maxcount, urls)
+
+    def commit(self):
+        if not self.pending or self.db.error:
+            return
+        self.db.executemany(*[("""INSERT OR REPLACE INTO availableart (mediaid, mediatype, arthash, maxcount, urls)
+            VALUES (?, ?, ?, ?, ?)""", (mediaid, mediatype, arthash, maxcount, json.dumps(urls)))
+            for (mediaid, mediatype), (arthash, maxcount, urls) in self.pending.items()])
+        self.pending.clear()
+
+    def prune(self, mediatype, mediaids):
+        '''Remove rows of `mediatype` for items not in `mediaids`, removed from the library.'''
+        self.commit()
+        if self.db.error:
+            return
+        removed = [row['mediaid'] for row in self.db.fetchall(
+            "SELECT mediaid FROM availableart WHERE mediatype=?", (mediatype,)) if row['mediaid'] not in mediaids]
+        if removed:
+            self.db.executemany(*[("DELETE FROM availableart WHERE mediaid=? AND mediatype=?", (mediaid, mediatype))
+                for mediaid in removed])
+        return len(removed)
+
+def upgrade_availableart(db, fromversion):
+    if fromversion == AVAILABLEART_VERSION:
+        return AVAILABLEART_VERSION
+
+    if fromversion == -1:
+        db.execute("""CREATE TABLE availableart (mediaid INTEGER NOT NULL, mediatype TEXT NOT NULL,
+            arthash TEXT NOT NULL, maxcount INTEGER NOT NULL, urls TEXT NOT NULL,
+            PRIMARY KEY (mediaid, mediatype))""")
+        return AVAILABLEART_VERSION
+
+    return fromversion
+
 SETTINGS_TABLE_VALUE = 'database-settings'
 # must be quoted to use as identifier
 SETTINGS_TABLE = '"{0}"'.format(SETTINGS_TABLE_VALUE)
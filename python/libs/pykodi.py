@@ -1,4 +1,6 @@
 import collections
+import collections.abc
+import functools
 import json
 import os
 import re
@@ -9,6 +11,8 @@ import xbmc
 import xbmcaddon
 from datetime import datetime
 
+from . import rpcprofile
+
 try:
     datetime.strptime('2112-04-01', '%Y-%m-%d')
 except TypeError:
@@ -71,7 +75,10 @@ def datetime_strptime(date_string, format_string):
             return datetime_strptime(date_string, format_string)
 
 def execute_jsonrpc(jsonrpc_command):
-    if isinstance(jsonrpc_command, dict):
+    profiler = rpcprofile.profiler
+    if profiler:
+        method = rpcprofile.get_method(jsonrpc_command)
+    if isinstance(jsonrpc_command, (dict, list)):
         try:
             jsonrpc_command = json.dumps(jsonrpc_command)
         except UnicodeDecodeError:
@@ -79,7 +86,12 @@ def execute_jsonrpc(jsonrpc_command):
 
     if not check_utf8(jsonrpc_command):
         return {}
-    json_result = xbmc.executeJSONRPC(jsonrpc_command)
+    if profiler:
+        start = time.perf_counter()
+        json_result = xbmc.executeJSONRPC(jsonrpc_command)
+        profiler.record(method, jsonrpc_command, json_result, time.perf_counter() - start)
+    else:
+        json_result = xbmc.executeJSONRPC(jsonrpc_command)
     return json.loads(json_result)
 
 def log(message, level=xbmc.LOGDEBUG, tag=None):
@@ -105,32 +117,72 @@ def check_utf8(string):
     except UnicodeEncodeError:
         return False
 
+IMAGECODEC_CACHE_SIZE = 4096
+
+@functools.lru_cache(maxsize=IMAGECODEC_CACHE_SIZE)
 def unquoteimage(imagestring):
     # all but actual image files need to keep their 'image://' encoding
-    parsed = urllib.parse.urlparse(imagestring)
-    if parsed.scheme == 'image' and not parsed.username:
-        return urllib.parse.unquote(parsed.hostname)
+    username, hostname = _split_imageurl(imagestring)
+    if username is False:
+        return imagestring
+    if not username:
+        return urllib.parse.unquote(hostname)
     return imagestring
 
 ParsedImage = collections.namedtuple('ParsedImage', ['scheme', 'file', 'specialtype'])
 
+@functools.lru_cache(maxsize=IMAGECODEC_CACHE_SIZE)
 def parseimage(imagestring: str) -> ParsedImage:
     if not imagestring.startswith('image://'):
         return ParsedImage('image', imagestring, '')
 
-    result = urllib.parse.urlparse(imagestring)
+    username, hostname = _split_imageurl(imagestring)
     return ParsedImage(
-        result.scheme,
-        urllib.parse.unquote(result.hostname),
-        result.username)
+        'image',
+        urllib.parse.unquote(hostname),
+        username)
 
+@functools.lru_cache(maxsize=IMAGECODEC_CACHE_SIZE)
 def quoteimage(imagestring):
     if imagestring.startswith('image://'):
         return imagestring
+    return 'image://' + quote_imagepath(imagestring) + '/'
+
+def quote_imagepath(path):
+    '''Quote a path to go inside an 'image://' URL, like Kodi does.'''
+    if path.isascii():
+        return path.translate(_imagepath_quotemap)
     # Kodi goes lowercase and doesn't encode some chars
-    result = 'image://{0}/'.format(urllib.parse.quote(imagestring, '()!'))
-    result = re.sub(r'%[0-9A-F]{2}', lambda mo: mo.group().lower(), result)
-    return result
+    result = urllib.parse.quote(path, '()!')
+    return re.sub(r'%[0-9A-F]{2}', lambda mo: mo.group().lower(), result)
+
+_imagepath_safe = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.-~()!')
+_imagepath_quotemap = dict((char, '%{0:02x}'.format(char)) for char in range(128)
+    if chr(char) not in _imagepath_safe)
+
+def _split_imageurl(imagestring):
+    '''The username and hostname of an 'image://' URL, like `urllib.parse.urlparse` gives them.
+    Returns (False, None) if the scheme isn't 'image'.'''
+    if imagestring.startswith('image://') and '[' not in imagestring and ']' not in imagestring \
+            and '\t' not in imagestring and '\r' not in imagestring and '\n' not in imagestring:
+        netloc = imagestring[8:]
+        for delim in '/?#':
+            netloc = netloc.split(delim, 1)[0]
+        userinfo, _, hostinfo = netloc.rpartition('@')
+        if hostinfo and ':' not in hostinfo and netloc.isascii():
+            username = userinfo.partition(':')[0] if '@' in netloc else None
+            # urlparse only lowercases the hostname up to an IPv6 zone ID
+            hostname, percent, zone = hostinfo.partition('%')
+            return username, hostname.lower() + percent + zone
+    elif imagestring[:1] > ' ' and not imagestring[:6].lower() == 'image:' and '\t' not in imagestring \
+            and '\r' not in imagestring and '\n' not in imagestring:
+        return False, None
+
+    # Anything unusual goes through the full parser
+    parsed = urllib.parse.urlparse(imagestring)
+    if parsed.scheme != 'image':
+        return False, None
+    return parsed.username, parsed.hostname
 
 class ObjectJSONEncoder(json.JSONEncoder):
     # Will still flop on circular objects
@@ -140,9 +192,9 @@ class ObjectJSONEncoder(json.JSONEncoder):
 
     def default(self, obj):
         # Called for objects that aren't directly JSON serializable
-        if isinstance(obj, collections.Mapping):
+        if isinstance(obj, collections.abc.Mapping):
             return dict((key, obj[key]) for key in obj.keys())
-        if isinstance(obj, collections.Sequence):
+        if isinstance(obj, collections.abc.Sequence):
             return list(obj)
         if callable(obj):
             return str(obj)
@@ -152,6 +204,12 @@ class ObjectJSONEncoder(json.JSONEncoder):
             return result
         except AttributeError:
             pass # obj has no __dict__ attribute
+        slots = [name for cls in type(obj).__mro__ for name in getattr(cls, '__slots__', ())]
+        if slots:
+            # unset slots are left out, like attributes never set on a regular object
+            result = dict((name, getattr(obj, name)) for name in slots if hasattr(obj, name))
+            result['* objecttype'] = str(type(obj))
+            return result
         result = {'* dir': dir(obj)}
         result['* objecttype'] = str(type(obj))
         return result
@@ -19,7 +19,44 @@ typemap = {mediatypes.MOVIE: ('Movie', ['art', 'imdbnumber', 'file', 'premiered'
 
 recent_filter = {'field': 'dateadded', 'operator': 'inthelast', 'value': '60'}
 
+# just enough properties to build the label of an item, see `mediainfo.build_label`
+labelprops = {mediatypes.EPISODE: ['showtitle'], mediatypes.SEASON: ['showtitle'],
+    mediatypes.MUSICVIDEO: ['artist', 'title'], mediatypes.ALBUM: ['artist', 'title'],
+    mediatypes.SONG: ['artist', 'title']}
+
 def get_item_details(dbid, mediatype):
+    json_request = _build_item_details_request(dbid, mediatype)
+    json_result = pykodi.execute_jsonrpc(json_request)
+
+    result_key = mediatype + 'details'
+    if check_json_result(json_result, result_key, json_request):
+        result = json_result['result'][result_key]
+        return result
+
+def get_item_details_batch(dbids, mediatype):
+    '''Get details of a list of items of one media type in one batch request, in the same order.
+    Items that Kodi returns an error for are left out of the result.'''
+    json_requests = []
+    for index, dbid in enumerate(dbids):
+        json_request = _build_item_details_request(dbid, mediatype)
+        json_request['id'] = index
+        json_requests.append(json_request)
+
+    json_results = pykodi.execute_jsonrpc(json_requests)
+    if not isinstance(json_results, list):
+        log(json_results)
+        return []
+    result_key = mediatype + 'details'
+    result = {}
+    for json_result in json_results:
+        index = json_result.get('id')
+        if 'error' in json_result or not isinstance(index, int) or not 0 <= index < len(dbids):
+            continue
+        if result_key in json_result.get('result', {}):
+            result[index] = json_result['result'][result_key]
+    return [result[index] for index in sorted(result)]
+
+def _build_item_details_request(dbid, mediatype):
     assert mediatype in typemap
 
     mapped = typemap[mediatype]
@@ -29,12 +66,7 @@ def get_item_details(dbid, mediatype):
     json_request['params']['properties'] = mapped[1]
     if mapped[2]:
         json_request['params'].update(mapped[2])
-    json_result = pykodi.execute_jsonrpc(json_request)
-
-    result_key = mediatype + 'details'
-    if check_json_result(json_result, result_key, json_request):
-        result = json_result['result'][result_key]
-        return result
+    return json_request
 
 def get_item_list(mediatype, extraparams=None, overrideprops=None):
     json_request, json_result = _inner_get_item_list(mediatype, extraparams, overrideprops)
@@ -74,19 +106,29 @@ def iter_new_item_list(mediatype):
 
     return _get_iter_with_first(mediatype, True, first_item), totalcount
 
-def iter_item_list(mediatype):
-    first_and_count = _get_first_item_and_count(mediatype, False)
+def iter_item_list(mediatype, overrideprops=None):
+    first_and_count = _get_first_item_and_count(mediatype, False, overrideprops)
+    if not first_and_count[0]:
+        return (), 0
+    first_item, totalcount = first_and_count
+
+    return _get_iter_with_first(mediatype, False, first_item, overrideprops), totalcount
+
+def iter_item_keylist(mediatype, only_recent=False):
+    '''Like `iter_item_list` with only IDs and labels, to go through a big library quickly.'''
+    overrideprops = labelprops.get(mediatype, [])
+    first_and_count = _get_first_item_and_count(mediatype, only_recent, overrideprops)
     if not first_and_count[0]:
         return (), 0
     first_item, totalcount = first_and_count
 
-    return _get_iter_with_first(mediatype, False, first_item), totalcount
+    return _get_iter_with_first(mediatype, only_recent, first_item, overrideprops), totalcount
 
-def _get_first_item_and_count(mediatype, only_recent):
+def _get_first_item_and_count(mediatype, only_recent, overrideprops=None):
     extraparams = {'limits': {'start': 0, 'end': 1}}
     if only_recent:
         extraparams['filter'] = recent_filter
-    json_request, json_result = _inner_get_item_list(mediatype, extraparams)
+    json_request, json_result = _inner_get_item_list(mediatype, extraparams, overrideprops)
     if not check_json_result(json_result, mediatype + 's', json_request):
         return None, 0
 
@@ -96,13 +138,13 @@ def _get_first_item_and_count(mediatype, only_recent):
         return None, 0
     return itemlist[0], total
 
-def _get_iter_with_first(mediatype, only_recent, first_item):
+def _get_iter_with_first(mediatype, only_recent, first_item, overrideprops=None):
     yield first_item
-    for item in _get_iter(mediatype, only_recent):
+    for item in _get_iter(mediatype, only_recent, overrideprops):
         yield item
 
-def _get_iter(mediatype, only_recent):
-    chunksize = 4000 if mediatype == mediatypes.EPISODE else 1000
+def _get_iter(mediatype, only_recent, overrideprops=None):
+    chunksize = 4000 if mediatype == mediatypes.EPISODE or overrideprops is not None else 1000
     source_exhausted = False
     lastend = 1
     while not source_exhausted:
@@ -110,7 +152,7 @@ def _get_iter(mediatype, only_recent):
         if only_recent:
             extraparams['filter'] = recent_filter
 
-        json_request, json_result = _inner_get_item_list(mediatype, extraparams)
+        json_request, json_result = _inner_get_item_list(mediatype, extraparams, overrideprops)
         if not check_json_result(json_result, mediatype + 's', json_request):
             break
 
@@ -239,17 +281,52 @@ def remove_texture_byurl(url):
         remove_texture(texture['textureid'])
 
 def get_available_art(dbid, mediatype, arttype=None):
+    json_request = _build_available_art_request(dbid, mediatype, arttype)
+
+    json_result = pykodi.execute_jsonrpc(json_request)
+    if check_json_result(json_result, 'availableart', json_request):
+        return json_result['result']['availableart']
+    else:
+        return []
+
+def get_available_art_batch(items, arttype=None):
+    '''Get available art for a list of (dbid, mediatype) in one batch request.
+    Items that Kodi returns an error for are left out of the result.'''
+    json_requests = []
+    for index, (dbid, mediatype) in enumerate(items):
+        json_request = _build_available_art_request(dbid, mediatype, arttype)
+        json_request['id'] = index
+        json_requests.append(json_request)
+
+    json_results = pykodi.execute_jsonrpc(json_requests)
+    result = {}
+    if not isinstance(json_results, list):
+        log(json_results)
+        return result
+    for json_result in json_results:
+        index = json_result.get('id')
+        if 'error' in json_result or not isinstance(index, int) or not 0 <= index < len(items):
+            continue
+        if 'availableart' in json_result.get('result', {}):
+            result[items[index]] = json_result['result']['availableart']
+    return result
+
+def _build_available_art_request(dbid, mediatype, arttype=None):
     lb = 'VideoLibrary' if mediatype not in mediatypes.audiotypes else 'AudioLibrary'
     json_request = get_base_json_request(lb + '.GetAvailableArt')
     json_request['params']['item'] = {mediatype + 'id': dbid}
     if arttype is not None:
         json_request['params']['arttype'] = arttype
+    return json_request
 
+def notify_all(sender, message, data=None):
+    json_request = get_base_json_request('JSONRPC.NotifyAll')
+    json_request['params'] = {'sender': sender, 'message': message}
+    if data is not None:
+        json_request['params']['data'] = data
     json_result = pykodi.execute_jsonrpc(json_request)
-    if check_json_result(json_result, 'availableart', json_request):
-        return json_result['result']['availableart']
-    else:
-        return []
+    if not check_json_result(json_result, None, json_request):
+        log(json_result)
 
 def get_base_json_request(method):
     return {'jsonrpc': '2.0', 'method': method, 'params': {}, 'id': 1}
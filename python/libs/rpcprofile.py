@@ -0,0 +1,87 @@
+import os
+import sys
+
+# upper bounds in milliseconds
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+TOP_CALLERS = 5
+# frames in these files are the plumbing, callers are reported from the first frame outside them
+_PLUMBING = ('pykodi.py', 'quickjson.py', 'rpcprofile.py')
+
+class MethodStats(object):
+    __slots__ = ('count', 'time', 'maxtime', 'sent', 'received', 'buckets', 'callers')
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.maxtime = 0.0
+        self.sent = 0
+        self.received = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.callers = {}
+
+class JSONRPCProfiler(object):
+    '''Counts, latency and payload sizes of JSON-RPC calls for each method, with the code calling them.'''
+    def __init__(self):
+        self.methods = {}
+
+    def record(self, method, command, result, elapsed):
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = MethodStats()
+        stats.count += 1
+        stats.time += elapsed
+        stats.maxtime = max(stats.maxtime, elapsed)
+        stats.sent += len(command.encode('utf-8'))
+        stats.received += len(result.encode('utf-8'))
+        milliseconds = elapsed * 1000
+        index = 0
+        while index < len(LATENCY_BUCKETS) and milliseconds > LATENCY_BUCKETS[index]:
+            index += 1
+        stats.buckets[index] += 1
+        caller = _find_caller()
+        stats.callers[caller] = stats.callers.get(caller, 0) + 1
+
+    def report(self):
+        if not self.methods:
+            return "No JSON-RPC calls"
+        lines = ["JSON-RPC calls by total time"]
+        for method, stats in sorted(self.methods.items(), key=lambda item: -item[1].time):
+            lines.append("{0}: {1} calls, total {2:.2f}s, mean {3:.1f}ms, max {4:.1f}ms, sent {5} bytes, received {6} bytes"
+                .format(method, stats.count, stats.time, stats.time * 1000 / stats.count, stats.maxtime * 1000,
+                    stats.sent, stats.received))
+            lines.append("  latency (ms): " + ', '.join('<={0}: {1}'.format(bound, count)
+                for bound, count in zip(LATENCY_BUCKETS + ('more',), stats.buckets) if count))
+            topcallers = sorted(stats.callers.items(), key=lambda item: -item[1])[:TOP_CALLERS]
+            for caller, count in topcallers:
+                lines.append("  {0} calls from {1}".format(count, caller))
+        return '\n'.join(lines)
+
+def get_method(command):
+    if isinstance(command, dict):
+        return command.get('method', '')
+    if isinstance(command, list):
+        return 'batch(' + ', '.join(sorted(set(item.get('method', '') for item in command))) + ')'
+    return 'raw'
+
+def _find_caller():
+    frame = sys._getframe(2)
+    via = None
+    while frame and os.path.basename(frame.f_code.co_filename) in _PLUMBING:
+        if os.path.basename(frame.f_code.co_filename) == 'quickjson.py':
+            via = frame.f_code.co_name
+        frame = frame.f_back
+    if not frame:
+        return 'unknown'
+    caller = '{0}:{1} {2}'.format(os.path.basename(frame.f_code.co_filename), frame.f_lineno, frame.f_code.co_name)
+    return caller + ' via quickjson.' + via if via else caller
+
+profiler = None
+
+def start(enabled):
+    global profiler
+    profiler = JSONRPCProfiler() if enabled else None
+
+def stop():
+    global profiler
+    result = profiler
+    profiler = None
+    return result
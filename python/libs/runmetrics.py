@@ -0,0 +1,92 @@
+import json
+import time
+import xbmc
+import xbmcvfs
+
+from .addonsettings import settings
+from .pykodi import log
+
+METRICS_FILENAME = 'runmetrics.jsonl'
+PROMETHEUS_FILENAME = 'artworkdump.prom'
+
+class RunMetrics(object):
+    '''Counts for one run, written as a JSON line to the add-on profile and optionally a Prometheus textfile.'''
+    def __init__(self, runname, totalcount):
+        self.runname = runname
+        self.totalcount = totalcount
+        self.started = time.time()
+        self.started_monotonic = time.monotonic()
+        self.scanned = 0
+        self.processed = 0
+        self.updated = 0
+        self.artcount = 0
+        self.errors = 0
+
+    def add_item(self, mediaitem):
+        self.processed += 1
+        if mediaitem.updatedart:
+            self.updated += 1
+            self.artcount += len(mediaitem.updatedart)
+        if mediaitem.error:
+            self.errors += 1
+
+    def build_record(self, downloader, aborted):
+        duration = time.monotonic() - self.started_monotonic
+        return {
+            'run': self.runname,
+            'started': round(self.started),
+            'duration': round(duration, 3),
+            'aborted': aborted,
+            'total': self.totalcount,
+            'scanned': self.scanned,
+            'processed': self.processed,
+            'updated': self.updated,
+            'art': self.artcount,
+            'errors': self.errors,
+            'bytes': downloader.size,
+            'host_errors': dict(downloader.host_errors),
+            'items_per_second': round(self.scanned / duration, 3) if duration else 0
+        }
+
+def write(record):
+    filename = settings.datapath + METRICS_FILENAME
+    if not xbmcvfs.exists(settings.datapath):
+        xbmcvfs.mkdir(settings.datapath)
+    # xbmcvfs.File can't append
+    with open(xbmcvfs.translatePath(filename), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, sort_keys=True) + '\n')
+    if settings.metrics_textfile_path:
+        _write_prometheus(record)
+
+def _write_prometheus(record):
+    lines = []
+    labels = '{{run="{0}"}}'.format(record['run'])
+    for name, key, help_ in (
+            ('artworkdump_run_timestamp_seconds', 'started', "Start time of the last run"),
+            ('artworkdump_run_duration_seconds', 'duration', "Duration of the last run"),
+            ('artworkdump_run_aborted', 'aborted', "1 if the last run was stopped before the end"),
+            ('artworkdump_run_items_scanned', 'scanned', "Library items scanned by the last run"),
+            ('artworkdump_run_items_updated', 'updated', "Library items with updated artwork"),
+            ('artworkdump_run_art_written', 'art', "Artwork updated in the library"),
+            ('artworkdump_run_errors', 'errors', "Items with errors"),
+            ('artworkdump_run_downloaded_bytes', 'bytes', "Bytes downloaded"),
+            ('artworkdump_run_items_per_second', 'items_per_second', "Items scanned per second")):
+        lines.append('# HELP {0} {1}'.format(name, help_))
+        lines.append('# TYPE {0} gauge'.format(name))
+        lines.append('{0}{1} {2}'.format(name, labels, int(record[key]) if key == 'aborted' else record[key]))
+    lines.append('# HELP artworkdump_run_host_errors Download errors by host')
+    lines.append('# TYPE artworkdump_run_host_errors gauge')
+    for host, count in sorted(record['host_errors'].items()):
+        lines.append('artworkdump_run_host_errors{{run="{0}",host="{1}"}} {2}'.format(
+            record['run'], host.replace('\\', '\\\\').replace('"', '\\"'), count))
+
+    folder = settings.metrics_textfile_path.rstrip('/\\') + '/'
+    filename = folder + PROMETHEUS_FILENAME
+    # write then rename, so the collector never reads a partial file
+    with xbmcvfs.File(filename + '.tmp', 'w') as f:
+        if not f.write('\n'.join(lines) + '\n'):
+            log("Couldn't write metrics textfile '{0}'".format(filename), xbmc.LOGWARNING)
+            return
+    if xbmcvfs.exists(filename):
+        xbmcvfs.delete(filename)
+    xbmcvfs.rename(filename + '.tmp', filename)
@@ -0,0 +1,67 @@
+import time
+from array import array
+from contextlib import nullcontext
+
+# stage name: array of durations in seconds, None while timing is off
+_stages = None
+_noop = nullcontext()
+
+class _Stage(object):
+    __slots__ = ('durations', 'start')
+    def __init__(self, durations):
+        self.durations = durations
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.durations.append(time.perf_counter() - self.start)
+
+def start(enabled):
+    global _stages
+    _stages = {} if enabled else None
+
+def stop():
+    global _stages
+    stages = _stages
+    _stages = None
+    return stages
+
+def stage(name):
+    '''Context manager timing one call of a stage, does nothing when timing is off.'''
+    if _stages is None:
+        return _noop
+    durations = _stages.get(name)
+    if durations is None:
+        durations = _stages[name] = array('d')
+    return _Stage(durations)
+
+def iter_timed(iterable, name):
+    '''Time how long each item of `iterable` takes to produce.'''
+    if _stages is None:
+        return iterable
+    return _iter_timed(iterable, name)
+
+def _iter_timed(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def summary(stages):
+    if not stages:
+        return "No stages timed"
+    lines = ["Stage timing (seconds)"]
+    for name, durations in sorted(stages.items(), key=lambda stage: -sum(stage[1])):
+        ordered = sorted(durations)
+        lines.append("{0}: count {1}, total {2:.2f}, mean {3:.4f}, p50 {4:.4f}, p90 {5:.4f}, p99 {6:.4f}, max {7:.4f}"
+            .format(name, len(ordered), sum(ordered), sum(ordered) / len(ordered), _percentile(ordered, 50),
+                _percentile(ordered, 90), _percentile(ordered, 99), ordered[-1]))
+    return '\n'.join(lines)
+
+def _percentile(ordered, percent):
+    return ordered[min(len(ordered) - 1, len(ordered) * percent // 100)]
@@ -1,3 +1,4 @@
+import os
 import re
 import xbmc
 from collections import namedtuple
@@ -120,3 +121,45 @@ def build_cleanest_name(originalname, uniqueslug=None):
     if uniqueslug:
         result += '_' + uniqueslug
     return result
+
+class PathMatcher(object):
+    '''Match paths against folder, prefix, and regex rules, compiled once up front.'''
+    def __init__(self, folders=(), prefixes=(), regexes=()):
+        self.folders = tuple(normalize_folder(folder) for folder in folders)
+        self.prefixes = tuple(prefixes)
+        self.regexes = _compile_regexes(regexes)
+
+    def __bool__(self):
+        return bool(self.folders or self.prefixes or self.regexes)
+
+    def matches(self, path):
+        if self.prefixes and path.startswith(self.prefixes):
+            return True
+        if self.folders and normalize_folder(path).startswith(self.folders):
+            return True
+        return any(regex.match(path) for regex in self.regexes)
+
+def normalize_folder(path):
+    # Only string operations, no file system access, so it works the same for SMB/NFS paths.
+    # Unlike the realpath this replaced, symlinks in local paths are not resolved; a folder rule matches
+    # the path as the library has it. Without a trailing separator, like before, so '/Movies' matches '/Movies2'.
+    return os.path.normpath(os.path.join(os.sep, path, ''))
+
+def _compile_regexes(regexes):
+    compiled = []
+    for regex in regexes:
+        try:
+            compiled.append(re.compile(regex))
+        except re.error as ex:
+            log("Ignoring invalid path exclusion regex '{0}': {1}".format(regex, ex), xbmc.LOGWARNING)
+    # only combine patterns without groups, joining renumbers groups and breaks numbered backreferences
+    combinable = [regex for regex in compiled if not regex.groups]
+    separate = [regex for regex in compiled if regex.groups]
+    if len(combinable) < 2:
+        return tuple(compiled)
+    try:
+        combined = re.compile('|'.join('(?:{0})'.format(regex.pattern) for regex in combinable))
+    except re.error:
+        # some can't be combined, like those with inline flags
+        return tuple(compiled)
+    return (combined,) + tuple(separate)
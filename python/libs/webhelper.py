@@ -1,19 +1,54 @@
-import requests
-from requests.adapters import HTTPAdapter
-from requests.exceptions import ConnectionError, Timeout, RequestException
-from requests.packages.urllib3.util.retry import Retry
+# requests is imported when first used, it is slow to import and the service doesn't need it until it downloads
 
-def retryable_session(retries=3, backoff_factor=0.5, status_forcelist=(500, 502, 504, 520), session=None):
+DEFAULT_POOLSIZE = 4
+# hosts to keep connection pools for
+POOL_HOSTS = 20
+
+_shared_session = None
+_shared_poolsize = None
+
+def retryable_session(retries=3, backoff_factor=0.5, status_forcelist=(500, 502, 504, 520), session=None,
+        poolsize=DEFAULT_POOLSIZE):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.packages.urllib3.util.retry import Retry
     # from https://www.peterbe.com/plog/best-practice-with-retries-with-requests
     session = session or requests.Session()
     # 'Retry-After' 413/429/503 headers are respected by default
     retry = Retry(total=retries, read=retries, connect=retries,
         backoff_factor=backoff_factor, status_forcelist=status_forcelist)
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=poolsize, max_retries=retry)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
 
+def get_shared_session(poolsize=DEFAULT_POOLSIZE):
+    '''A session kept for the life of the process, so connections to each host are kept alive across runs.
+    It is replaced if the pool size changes.'''
+    global _shared_session, _shared_poolsize
+    if _shared_session is None or poolsize != _shared_poolsize:
+        if _shared_session is not None:
+            _shared_session.close()
+        _shared_session = retryable_session(poolsize=poolsize)
+        _shared_poolsize = poolsize
+    return _shared_session
+
+def connection_stats():
+    '''Requests and new connections for each host with an open pool in the shared session.
+    Requests that didn't need a new connection reused one from the pool.'''
+    result = {}
+    if _shared_session is None:
+        return result
+    adapters = dict((id(adapter), adapter) for adapter in _shared_session.adapters.values())
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests, connections = result.get(pool.host, (0, 0))
+                result[pool.host] = (requests + pool.num_requests, connections + pool.num_connections)
+    return result
+
 class Getter(object):
     def __init__(self, contenttype=None, login=lambda: False, session=None):
         self.session = session or retryable_session()
@@ -22,21 +57,29 @@ class Getter(object):
             self.session.headers['Accept'] = contenttype
 
     def __call__(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return self.request('HEAD', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        from requests.exceptions import ConnectionError, Timeout, RequestException
         try:
-            return self._inner_call(url, **kwargs)
+            return self._inner_call(method, url, **kwargs)
         except (Timeout, ConnectionError, RequestException) as ex:
             message = ex.response.reason if getattr(ex, 'response', None) is not None else type(ex).__name__
             raise GetterError(message, ex, not isinstance(ex, RequestException))
 
-    def _inner_call(self, url, **kwargs):
+    def _inner_call(self, method, url, **kwargs):
         if 'timeout' not in kwargs:
             kwargs['timeout'] = 20
-        result = self.session.get(url, **kwargs)
+        result = self.session.request(method, url, **kwargs)
         if result is None:
             return
         if result.status_code == 401:
             if self.login():
-                result = self.session.get(url, **kwargs)
+                result = self.session.request(method, url, **kwargs)
                 if result is None:
                     return
 
@@ -46,6 +89,21 @@ class Getter(object):
         result.raise_for_status()
         return result
 
+def read_content(response, limiter=None):
+    '''Read the body of a streamed response, waiting on `limiter` for each chunk.
+    Raises GetterError for connection problems, like Getter.'''
+    from requests.exceptions import RequestException
+    content = bytearray()
+    chunk_size = limiter.chunk_size if limiter else 64 * 1024
+    try:
+        for chunk in response.iter_content(chunk_size):
+            if limiter:
+                limiter.consume(len(chunk))
+            content += chunk
+    except RequestException as ex:
+        raise GetterError(type(ex).__name__, ex, True)
+    return content
+
 class GetterError(Exception):
     def __init__(self, message, cause, connection_error):
         super(GetterError, self).__init__()
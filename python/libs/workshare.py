@@ -0,0 +1,205 @@
+import json
+import os
+import time
+import uuid
+import xbmc
+import xbmcvfs
+
+from .addonsettings import settings
+from .pykodi import log
+
+# items are claimed in blocks of consecutive library IDs, shared MySQL libraries have the same IDs on every client
+SHARE_BLOCK_SIZE = 200
+# clients join the last run unless it finished or no client has worked on it for this long
+STALE_TIME = 60 * 60
+# clients working on a run update its heartbeat at most this often between blocks
+HEARTBEAT_INTERVAL = 5 * 60
+
+RUNINFO_FILENAME = 'run.json'
+FINISHED_FILENAME = 'finished'
+HEARTBEAT_FILENAME = 'heartbeat'
+# in a block folder once all of its items are processed
+DONE_FILENAME = 'done'
+
+class WorkShare(object):
+    '''Split a run with other clients using the same library, through a shared folder.
+
+    Each run gets a numbered folder, clients that start the same run while it is going join it
+    and the next one after it finished starts a new folder. A client claims a block of items
+    by creating a folder for it in the run folder, and gives it back if it stops before the last
+    item of the block is processed. The run is finished when every claimed block is done. Files are used instead of SQLite, its locking isn't reliable on network shares.'''
+    def __init__(self, runname):
+        self.enabled = settings.share_work and bool(settings.share_path)
+        self.runname = runname
+        self.clientid = get_clientid() if self.enabled else None
+        self.claimed = set()
+        self.skipped = set()
+        # block: set of (mediatype, dbid) not processed yet, given back if the run stops before they are
+        self.pending = {}
+        # (mediatype, dbid): block
+        self.itemblocks = {}
+        self.lastbeat = 0
+        if self.enabled:
+            self.runpath = self._join_run()
+
+    def iter_blocks(self, mediatype, dbids):
+        '''Claim the blocks of `dbids` in ID order, one at a time as the list is read.
+        Yields (block, IDs) for each block claimed, pass the items listed for it to `start_block`.
+        Blocks another client has are tried again at the end, in case that client gave them back,
+        and yield the number of IDs in them if they still can't be claimed.'''
+        blocks = {}
+        for dbid in dbids:
+            blocks.setdefault(dbid // SHARE_BLOCK_SIZE, []).append(dbid)
+        taken = []
+        for number in sorted(blocks):
+            block = '{0}-{1}'.format(mediatype, number)
+            if self._claim(block):
+                self.claimed.add(block)
+                self._heartbeat(True)
+                yield block, sorted(blocks[number])
+            else:
+                taken.append(number)
+        for number in taken:
+            block = '{0}-{1}'.format(mediatype, number)
+            if self._claim(block):
+                self.claimed.add(block)
+                self._heartbeat(True)
+                yield block, sorted(blocks[number])
+            else:
+                self.skipped.add(block)
+                yield len(blocks[number])
+
+    def start_block(self, block, mediatype, dbids):
+        '''Track the items of a claimed block until each one is passed to `item_done`.'''
+        self.pending[block] = set((mediatype, dbid) for dbid in dbids)
+        for dbid in dbids:
+            self.itemblocks[(mediatype, dbid)] = block
+        if not dbids:
+            self._block_done(block)
+
+    def claim_item(self, mediatype, dbid):
+        '''Claim a single item, for parent items gathered from the items of several blocks.'''
+        if not self.enabled:
+            return True
+        block = '{0}-id{1}'.format(mediatype, dbid)
+        if not self._claim(block):
+            return False
+        self.start_block(block, mediatype, [dbid])
+        return True
+
+    def item_done(self, mediatype, dbid):
+        '''Called by the processor once an item is processed, even if the list read further ahead.'''
+        block = self.itemblocks.pop((mediatype, dbid), None)
+        if block is None:
+            return
+        pending = self.pending[block]
+        pending.discard((mediatype, dbid))
+        if not pending:
+            self._block_done(block)
+        else:
+            self._heartbeat()
+
+    def finish(self, successful):
+        '''Mark the run finished, or give back blocks with items not processed yet if it stopped early.'''
+        if not self.enabled:
+            return
+        for block in self.pending:
+            xbmcvfs.rmdir(self.runpath + block + '/', True)
+        # other clients can still have blocks going, the last one to finish marks the run
+        if successful and self._all_blocks_done():
+            with xbmcvfs.File(self.runpath + FINISHED_FILENAME, 'w') as f:
+                f.write(self.clientid)
+        if self.claimed or self.skipped:
+            log("Shared run '{0}': processed {1} blocks, {2} blocks left to other clients, {3} given back".format(
+                self.runname, len(self.claimed) - len(self.pending), len(self.skipped), len(self.pending)),
+                xbmc.LOGINFO)
+        self.claimed.clear()
+        self.skipped.clear()
+        self.pending.clear()
+        self.itemblocks.clear()
+
+    def _join_run(self):
+        runspath = settings.share_path.rstrip('/\\') + '/artworkdump-runs/' + self.runname + '/'
+        if not xbmcvfs.exists(runspath):
+            xbmcvfs.mkdirs(runspath)
+        numbers = [int(folder) for folder in xbmcvfs.listdir(runspath)[0] if folder.isdigit()]
+        latest = max(numbers) if numbers else 0
+        if latest and _is_joinable(runspath + str(latest) + '/'):
+            log("Joining shared run '{0}' #{1}".format(self.runname, latest), xbmc.LOGINFO)
+            return runspath + str(latest) + '/'
+
+        number = latest + 1
+        runpath = runspath + str(number) + '/'
+        if _create_folder(runpath):
+            with xbmcvfs.File(runpath + RUNINFO_FILENAME, 'w') as f:
+                f.write(json.dumps({'client': self.clientid, 'started': time.time()}))
+            log("Starting shared run '{0}' #{1}".format(self.runname, number), xbmc.LOGINFO)
+            for old in numbers:
+                if old < number - 1 and not _is_recent(runspath + str(old) + '/'):
+                    xbmcvfs.rmdir(runspath + str(old) + '/', True)
+        else:
+            log("Joining shared run '{0}' #{1}".format(self.runname, number), xbmc.LOGINFO)
+        return runpath
+
+    def _claim(self, block):
+        return _create_folder(self.runpath + block + '/')
+
+    def _block_done(self, block):
+        del self.pending[block]
+        with xbmcvfs.File(self.runpath + block + '/' + DONE_FILENAME, 'w') as f:
+            f.write(self.clientid)
+        self._heartbeat(True)
+
+    def _all_blocks_done(self):
+        return all(xbmcvfs.exists(self.runpath + block + '/' + DONE_FILENAME)
+            for block in xbmcvfs.listdir(self.runpath)[0])
+
+    def _heartbeat(self, force=False):
+        now = time.time()
+        if not force and now - self.lastbeat < HEARTBEAT_INTERVAL:
+            return
+        self.lastbeat = now
+        with xbmcvfs.File(self.runpath + HEARTBEAT_FILENAME, 'w') as f:
+            f.write(str(now))
+
+def _is_joinable(runpath):
+    return not xbmcvfs.exists(runpath + FINISHED_FILENAME) and _is_recent(runpath)
+
+def _is_recent(runpath):
+    if xbmcvfs.exists(runpath + HEARTBEAT_FILENAME):
+        with xbmcvfs.File(runpath + HEARTBEAT_FILENAME) as f:
+            content = f.read()
+        try:
+            return time.time() - float(content) < STALE_TIME
+        except ValueError:
+            return False
+    filename = runpath + RUNINFO_FILENAME
+    if not xbmcvfs.exists(filename):
+        # just started, the info file is written right after the folder
+        return True
+    with xbmcvfs.File(filename) as f:
+        content = f.read()
+    try:
+        return time.time() - json.loads(content).get('started', 0) < STALE_TIME
+    except ValueError:
+        return False
+
+def _create_folder(path):
+    '''Create a folder, returning False if it already exists. This is the lock, only one client
+    can create each folder. os.mkdir is atomic for local and mounted folders; Kodi's VFS reports
+    success for a folder that exists, so for its URLs this checks first and a narrow race remains.'''
+    localpath = xbmcvfs.translatePath(path)
+    if '://' not in localpath:
+        try:
+            os.mkdir(localpath)
+            return True
+        except OSError:
+            return False
+    if xbmcvfs.exists(path):
+        return False
+    return bool(xbmcvfs.mkdir(path))
+
+def get_clientid():
+    if not settings.share_clientid:
+        settings.set_share_clientid(uuid.uuid4().hex)
+    return settings.share_clientid
@@ -1,31 +1,77 @@
 import json
+import time
+from collections import deque
 import xbmc
 from datetime import datetime, timedelta, timezone
 
 from artworkprocessor import ArtworkProcessor
-from libs import mediainfo as info, mediatypes, pykodi, quickjson
-from libs.addonsettings import settings, SCAN_NEW_DATABASE, SCAN_NEW_DAYS
-from libs.processeditems import ProcessedItems
+from libs import mediainfo as info, memprofile, mediatypes, pykodi, quickjson
+from libs.addonsettings import settings, SCAN_NEW_DAYS
+from libs.workshare import WorkShare
 from libs.pykodi import log
 
 STATUS_IDLE = 'idle'
 STATUS_SIGNALLED = 'signalled'
 STATUS_PROCESSING = 'processing'
+STATUS_PAUSED = 'paused'
+
+WAIT_SLICE = 0.2
+SCAN_POLL_INTERVAL = 5
+# during a scan, process added items in small batches once Kodi is done updating each of them
+SCAN_SETTLE_TIME = 3
+SCAN_BATCH_SIZE = 20
+# items of a claimed block of a shared run fetched in one request
+DETAILS_BATCH_SIZE = 50
+
+RECENT_VIDEOTYPES = (mediatypes.MOVIE, mediatypes.TVSHOW, mediatypes.EPISODE, mediatypes.MUSICVIDEO)
+RECENT_MUSICTYPES = (mediatypes.ARTIST, mediatypes.ALBUM, mediatypes.SONG)
 
 class ArtworkService(xbmc.Monitor):
     def __init__(self):
         super(ArtworkService, self).__init__()
         self.abort = False
-        self.processor = ArtworkProcessor(self)
-        self.processed = ProcessedItems(settings.determine_new_algo != SCAN_NEW_DATABASE)
-        self.recentvideos = {'movie': [], 'tvshow': [], 'episode': [], 'musicvideo': []}
+        # created for the first run, so the service starts quickly with Kodi
+        self._processor = None
+        # mediatype: {dbid: time of last update}
+        self.recentvideos = dict((mediatype, {}) for mediatype in RECENT_VIDEOTYPES)
+        self.recentmusic = dict((mediatype, {}) for mediatype in RECENT_MUSICTYPES)
+        # items already processed in batches during the current scan
+        self.scanhandled = set()
+        # batches during a scan are processed in one run, closed when the scan finishes
+        self.scanrun = False
+        # (mediatype, dbid) asked for interactively, these go ahead of everything else
+        self.priorityitems = deque()
+        self.in_checkpoint = False
         self.stoppeditems = set()
+        self.recent_due = 0
+        self.recentmusic_due = 0
+        self.scanning_libraries = set()
+        self.scanpoll_time = 0
+        self.poll_scanning()
+        self.playing = xbmc.Player().isPlaying()
         self._signal = None
         self._status = None
         self.status = STATUS_IDLE
+        memprofile.watch('stoppeditems', lambda: len(self.stoppeditems))
+        memprofile.watch('scanhandled', lambda: len(self.scanhandled))
+
+    @property
+    def processor(self):
+        if not self._processor:
+            self._processor = ArtworkProcessor(self)
+        return self._processor
+
+    @property
+    def processed(self):
+        return self.processor.processed
 
-    def reset_recent(self):
-        self.recentvideos = {'movie': [], 'tvshow': [], 'episode': [], 'musicvideo': []}
+    @property
+    def has_recent(self):
+        return any(self.recentvideos.values())
+
+    @property
+    def has_recentmusic(self):
+        return any(self.recentmusic.values())
 
     def abortRequested(self):
         return self.waitForAbort(0.0001)
@@ -38,7 +84,16 @@ class ArtworkService(xbmc.Monitor):
 
     @property
     def scanning(self):
-        return pykodi.get_conditional('Library.IsScanningVideo | Library.IsScanningMusic')
+        return bool(self.scanning_libraries)
+
+    def poll_scanning(self):
+        '''Check scanning state directly, only while a scan is in progress in case a notification is missed.'''
+        self.scanpoll_time = time.monotonic()
+        self.scanning_libraries.clear()
+        if pykodi.get_conditional('Library.IsScanningVideo'):
+            self.scanning_libraries.add('video')
+        if pykodi.get_conditional('Library.IsScanningMusic'):
+            self.scanning_libraries.add('music')
 
     @property
     def status(self):
@@ -74,11 +129,16 @@ class ArtworkService(xbmc.Monitor):
         if method.startswith('Other.') and sender != 'script.artwork.dump:control':
             return
         if method == 'Other.CancelCurrent':
-            if self.status == STATUS_PROCESSING:
+            if self.status in (STATUS_PROCESSING, STATUS_PAUSED):
                 self.abort = True
             elif self.signal:
                 self.signal = None
                 self.processor.close_progress()
+        elif method == 'Other.ProcessItem':
+            data = json.loads(data)
+            self.priorityitems.append((data['mediatype'], data['dbid']))
+            if self.status == STATUS_IDLE:
+                self.status = STATUS_SIGNALLED
         elif method == 'Other.ProcessNewVideos':
             self.processor.create_progress()
             self.signal = 'newvideos'
@@ -91,16 +151,26 @@ class ArtworkService(xbmc.Monitor):
         elif method == 'Other.ProcessAllMusic':
             self.processor.create_progress()
             self.signal = 'allmusic'
+        elif method in ('Player.OnPlay', 'Player.OnAVStart', 'Player.OnResume'):
+            # background work slows down while playing, see ArtworkProcessor.throttle_time
+            self.playing = True
         elif method == 'Player.OnStop':
+            self.playing = False
             if settings.enableservice:
                 data = json.loads(data)
                 if self.watchitem(data):
                     self.stoppeditems.add((data['item']['type'], data['item']['id']))
         elif method == 'VideoLibrary.OnScanStarted':
-            if settings.enableservice and self.status == STATUS_PROCESSING:
-                self.abort = True
+            # a run in progress pauses at the next item, see `checkpoint`
+            self.scanning_libraries.add('video')
         elif method == 'VideoLibrary.OnScanFinished':
-            if settings.enableservice:
+            self.scanning_libraries.discard('video')
+            if not settings.enableservice:
+                return
+            if self.status in (STATUS_PROCESSING, STATUS_PAUSED):
+                # the paused run resumes first, leave its status and progress alone
+                self._signal = 'newvideos'
+            else:
                 self.signal = 'newvideos'
                 self.processor.create_progress()
         elif method == 'VideoLibrary.OnUpdate':
@@ -112,35 +182,77 @@ class ArtworkService(xbmc.Monitor):
             if (data['item']['type'], data['item']['id']) in self.stoppeditems:
                 self.stoppeditems.remove((data['item']['type'], data['item']['id']))
                 return
-            if not self.scanning:
-                self.recentvideos[data['item']['type']].append(data['item']['id'])
-                self.signal = 'recentvideos'
+            now = time.monotonic()
+            _queue_item(self.recentvideos, data['item']['type'], data['item']['id'], now)
+            # wait for a quiet moment to catch rapid fire VideoLibrary.OnUpdate
+            self.recent_due = now + settings.update_debounce
+            if self.status == STATUS_IDLE:
+                self.status = STATUS_SIGNALLED
+        elif method == 'AudioLibrary.OnUpdate':
+            # items a music scan adds are left to the new music pass after it
+            if not settings.enableservice_music or 'music' in self.scanning_libraries:
+                return
+            data = json.loads(data)
+            # music has 'type' and 'id' at the top level, but accept it like video as well
+            item = data.get('item', data)
+            # only added items, the processor's own art updates come through here too
+            if not data.get('added') or 'playcount' in data or item.get('type') not in self.recentmusic \
+                    or not item.get('id') or item['id'] == -1:
+                return
+            now = time.monotonic()
+            _queue_item(self.recentmusic, item['type'], item['id'], now)
+            self.recentmusic_due = now + settings.update_debounce
+            if self.status == STATUS_IDLE:
+                self.status = STATUS_SIGNALLED
+        elif method == 'AudioLibrary.OnScanStarted':
+            self.scanning_libraries.add('music')
         elif method == 'AudioLibrary.OnScanFinished':
+            self.scanning_libraries.discard('music')
             if settings.enableservice_music:
                 self.signal = 'newmusic'
 
     def run(self):
-        while not self.really_waitforabort(5):
+        while not self.really_waitforabort(WAIT_SLICE):
             if self.scanning:
+                if time.monotonic() - self.scanpoll_time >= SCAN_POLL_INTERVAL:
+                    self.poll_scanning()
+                if self.priorityitems:
+                    self.process_priorityitems()
+                if self.has_recent and settings.enableservice:
+                    self.process_recentvideos(SCAN_BATCH_SIZE, time.monotonic() - SCAN_SETTLE_TIME)
+                if self.has_recentmusic and 'music' not in self.scanning_libraries \
+                        and time.monotonic() >= self.recentmusic_due:
+                    self.process_recentmusic()
                 continue
+            if self.scanrun:
+                self.close_scanrun()
+            if self.priorityitems:
+                self.process_priorityitems()
+            if self.has_recent and time.monotonic() >= self.recent_due:
+                self.process_recentvideos()
+            if self.has_recentmusic and time.monotonic() >= self.recentmusic_due:
+                self.process_recentmusic()
             if self.signal:
                 signal = self.signal
                 self._signal = None
-                if signal == 'recentvideos':
-                    # Add a delay to catch rapid fire VideoLibrary.OnUpdate
-                    self.signal = 'recentvideos_really'
-                    continue
                 self.status = STATUS_PROCESSING
                 if signal == 'allvideos':
                     successful = self.process_allvideos()
                     self.notify_finished('Video', successful)
                     settings.set_last_video_run(str(_get_date_numeric()))
                 if signal == 'newvideos':
+                    started = time.monotonic()
                     if settings.determine_new_algo == SCAN_NEW_DAYS:
                         do_new = settings.last_video_run and float(settings.last_video_run) > _get_date_numeric(45)
-                        successful = self.process_newvideos() if do_new else self.process_allvideos()
+                        successful = self.process_newvideos() if do_new \
+                            else self.process_allvideos(self._skip_scanhandled(), 'newvideos')
                     else:
-                        successful = self.process_allvideos(self.processed.does_not_exist)
+                        successful = self.process_allvideos(self._skip_scanhandled(self.processed.does_not_exist),
+                            'newvideos')
+                    if successful:
+                        # this pass covers videos added before it started as well
+                        _take_queued(self.recentvideos, settled_before=started)
+                        self.scanhandled.clear()
                     self.notify_finished('Video', successful)
                     settings.set_last_video_run(str(_get_date_numeric()))
                 if signal == 'allmusic':
@@ -148,79 +260,207 @@ class ArtworkService(xbmc.Monitor):
                     self.notify_finished('Music', successful)
                     settings.set_last_music_run(str(_get_date_numeric()))
                 if signal == 'newmusic':
+                    started = time.monotonic()
                     do_new = settings.last_music_run and float(settings.last_music_run) > _get_date_numeric(45)
                     successful = self.process_newmusic() if do_new else self.process_allmusic()
+                    if successful:
+                        _take_queued(self.recentmusic, settled_before=started)
                     self.notify_finished('Music', successful)
                     settings.set_last_music_run(str(_get_date_numeric()))
-                elif signal == 'recentvideos_really':
-                    self.process_recentvideos()
 
-            self.status = STATUS_IDLE
+                self._update_idle_status()
+        if self.scanrun:
+            self.close_scanrun(True)
+
+    def close_scanrun(self, aborted=False):
+        self.scanrun = False
+        self.processor.close_run(aborted)
+        self._update_idle_status()
+
+    def _process_items(self, medialist, totalcount, runname, alwaysnotify=False):
+        '''Process a list in the open scan run, or as a run of its own.'''
+        if self.scanrun:
+            return self.processor.process_inline(medialist, totalcount)
+        return self.processor.process_list_with_total(medialist, totalcount, alwaysnotify, runname)
+
+    def checkpoint(self, processor):
+        '''Called by the processor between items, to process interactive and recently added items
+        ahead of the rest of a long list. Returns True if the current list should stop.'''
+        if self.in_checkpoint:
+            return self.abort
+        self.in_checkpoint = True
+        try:
+            if processor.background and 'video' in self.scanning_libraries and self.wait_for_scan(processor):
+                return True
+            if self.priorityitems:
+                processor.process_inline(self.iter_priorityitems())
+            if self.has_recent and not self.scanning and time.monotonic() >= self.recent_due:
+                recentvideos = _take_queued(self.recentvideos)
+                processed = set()
+                if not processor.process_inline(self.iter_recentvideos(recentvideos, processed)):
+                    _requeue(self.recentvideos, recentvideos)
+                elif processor.background or self.signal == 'newvideos':
+                    # the new videos pass skips these, also the one after the current pass
+                    self.scanhandled.update(processed)
+            if self.has_recentmusic and not self.scanning and time.monotonic() >= self.recentmusic_due:
+                recentmusic = _take_queued(self.recentmusic)
+                if not processor.process_inline(self.iter_recentmusic(recentmusic)):
+                    _requeue(self.recentmusic, recentmusic)
+        finally:
+            self.in_checkpoint = False
+        return self.abort
+
+    def wait_for_scan(self, processor):
+        '''Pause the current list while the video library scans, keeping its place and caches.
+        Items the scan adds are processed in small batches meanwhile. Returns True to abort.'''
+        if self.abort:
+            return True
+        log("Pausing for library scan")
+        self.status = STATUS_PAUSED
+        while 'video' in self.scanning_libraries:
+            if self.really_waitforabort(WAIT_SLICE) or self.abort:
+                return True
+            if time.monotonic() - self.scanpoll_time >= SCAN_POLL_INTERVAL:
+                self.poll_scanning()
+            if self.priorityitems:
+                processor.process_inline(self.iter_priorityitems())
+            if self.has_recent and settings.enableservice:
+                recentvideos = _take_queued(self.recentvideos, SCAN_BATCH_SIZE, time.monotonic() - SCAN_SETTLE_TIME)
+                processed = set()
+                if processor.process_inline(self.iter_recentvideos(recentvideos, processed)):
+                    self.scanhandled.update(processed)
+                else:
+                    _requeue(self.recentvideos, recentvideos)
+            if self.abort:
+                return True
+        log("Library scan finished, resuming")
+        self.status = STATUS_PROCESSING
+        return False
+
+    def process_priorityitems(self):
+        log("Processing requested items")
+        self.status = STATUS_PROCESSING
+        items = list(self.iter_priorityitems())
+        if items:
+            self._process_items(items, len(items), 'requested', True)
+        self._update_idle_status()
+
+    def iter_priorityitems(self):
+        while self.priorityitems:
+            mediatype, dbid = self.priorityitems.popleft()
+            jsonitem = quickjson.get_item_details(dbid, mediatype)
+            if jsonitem:
+                yield info.MediaItem(jsonitem)
 
-    def process_allvideos(self, shouldinclude_fn=None):
+    def _skip_scanhandled(self, shouldinclude_fn=None):
+        if not self.scanhandled:
+            return shouldinclude_fn
+        scanhandled = set(self.scanhandled)
+        def shouldinclude(dbid, mediatype, label):
+            if (mediatype, dbid) in scanhandled:
+                return False
+            return not shouldinclude_fn or shouldinclude_fn(dbid, mediatype, label)
+        return shouldinclude
+
+    def process_allvideos(self, shouldinclude_fn=None, runname='allvideos'):
         log("Processing all video items")
-        return self._process_mediatypes(mediatypes.videotypes, shouldinclude_fn)
+        return self._process_mediatypes(mediatypes.videotypes, shouldinclude_fn, runname)
 
-    def process_allmusic(self, shouldinclude_fn=None):
+    def process_allmusic(self, shouldinclude_fn=None, runname='allmusic'):
         log("Processing all music items")
-        return self._process_mediatypes(mediatypes.audiotypes, shouldinclude_fn)
+        return self._process_mediatypes(mediatypes.audiotypes, shouldinclude_fn, runname)
 
-    def _process_mediatypes(self, media_types, shouldinclude_fn):
-        media_lists = [quickjson.iter_item_list(mediatype) for mediatype in media_types]
+    def _process_mediatypes(self, media_types, shouldinclude_fn, runname):
+        share = WorkShare(runname)
+        if share.enabled:
+            media_lists = [_list_shared_items(share, mediatype, False, shouldinclude_fn) for mediatype in media_types]
+            shouldinclude_fn = None
+        else:
+            media_lists = [quickjson.iter_item_list(mediatype) for mediatype in media_types]
         totalcount = sum(media_list[1] for media_list in media_lists)
 
         def flatten_to_mediaitems():
             count = 0
             for medialist in media_lists:
                 for mediaitem in medialist[0]:
-                    item = info.MediaItem(mediaitem)
-                    yielditem = not shouldinclude_fn or shouldinclude_fn(item.dbid, item.mediatype, item.label)
+                    if isinstance(mediaitem, int):
+                        # skipped while sharing the run
+                        count += mediaitem
+                        continue
+                    key = info.get_item_key(mediaitem)
+                    yielditem = not shouldinclude_fn or shouldinclude_fn(key.dbid, key.mediatype, key.label)
                     if count > 1000 or yielditem and count > 0:
                         yield count
                         count = 0
                     if yielditem:
-                        yield item
+                        yield info.MediaItem(mediaitem, key)
                     else:
                         count += 1
 
-        result = self.processor.process_list_with_total(flatten_to_mediaitems(), totalcount)
+        result = self.processor.process_list_with_total(flatten_to_mediaitems(), totalcount, runname=runname,
+            background=True, item_done=share.item_done if share.enabled else None)
+        share.finish(result)
+        if result:
+            for mediatype in media_types:
+                info.prune_availableart(mediatype)
         return result
 
     def process_newvideos(self):
-        media_lists = [quickjson.iter_new_item_list(mediatype)
-            for mediatype in (mediatypes.EPISODE, mediatypes.MOVIE, mediatypes.MUSICVIDEO)]
+        parent_items = []
+        added_parents = set(self.scanhandled)
+        share = WorkShare('newvideos')
+        memprofile.watch('parent_items', lambda: len(parent_items))
+
+        media_types = (mediatypes.EPISODE, mediatypes.MOVIE, mediatypes.MUSICVIDEO)
+        if share.enabled:
+            def shouldinclude(dbid, mediatype, label):
+                return (mediatype, dbid) not in added_parents
+            media_lists = [_list_shared_items(share, mediatype, True, shouldinclude) for mediatype in media_types]
+        else:
+            media_lists = [quickjson.iter_new_item_list(mediatype) for mediatype in media_types]
         # doesn't count seasons, tvshows, or movie sets
         totalcount = sum(media_list[1] for media_list in media_lists)
 
-        parent_items = []
-        added_seasons = set()
-        added_tvshows = set()
-        added_sets = set()
+        def add_parent(mediatype, dbid):
+            if (mediatype, dbid) in added_parents:
+                return
+            added_parents.add((mediatype, dbid))
+            if not share.claim_item(mediatype, dbid):
+                # another client processes this one
+                return
+            parent = info.get_cached_parent(mediatype, dbid)
+            if parent:
+                parent_items.append(info.MediaItem(parent))
+            else:
+                share.item_done(mediatype, dbid)
 
         def flatten_to_mediaitems():
             for medialist in media_lists:
                 for mediaitem in medialist[0]:
-                    jsonitem = info.MediaItem(mediaitem)
+                    if isinstance(mediaitem, int):
+                        # skipped while sharing the run
+                        yield mediaitem
+                        continue
+                    key = info.get_item_key(mediaitem)
+                    if (key.mediatype, key.dbid) in added_parents:
+                        # already processed during the scan
+                        yield 1
+                        continue
+                    jsonitem = info.MediaItem(mediaitem, key)
                     yield jsonitem
                     if jsonitem.mediatype == mediatypes.EPISODE:
-                        if mediaitem['seasonid'] not in added_seasons:
-                            season = quickjson.get_item_details(mediaitem['seasonid'], mediatypes.SEASON)
-                            parent_items.append(info.MediaItem(season))
-                            added_seasons.add(mediaitem['seasonid'])
-                        if mediaitem['tvshowid'] not in added_tvshows:
-                            tvshow = quickjson.get_item_details(mediaitem['tvshowid'], mediatypes.TVSHOW)
-                            parent_items.append(info.MediaItem(tvshow))
-                            added_tvshows.add(mediaitem['tvshowid'])
+                        add_parent(mediatypes.SEASON, mediaitem['seasonid'])
+                        add_parent(mediatypes.TVSHOW, mediaitem['tvshowid'])
                     if jsonitem.mediatype == mediatypes.MOVIE and mediaitem.get('setid'):
-                        if mediaitem['setid'] not in added_sets:
-                            movieset = quickjson.get_item_details(mediaitem['setid'], mediatypes.MOVIESET)
-                            parent_items.append(info.MediaItem(movieset))
-                            added_sets.add(mediaitem['setid'])
+                        add_parent(mediatypes.MOVIESET, mediaitem['setid'])
 
             for item in parent_items:
                 yield item
 
-        result = self.processor.process_list_with_total(flatten_to_mediaitems(), totalcount)
+        result = self.processor.process_list_with_total(flatten_to_mediaitems(), totalcount, runname='newvideos',
+            background=True, item_done=share.item_done if share.enabled else None)
+        memprofile.unwatch('parent_items')
+        share.finish(result)
         return result
 
     def process_newmusic(self):
@@ -235,42 +475,155 @@ class ArtworkService(xbmc.Monitor):
                     jsonitem = info.MediaItem(mediaitem)
                     yield jsonitem
 
-        result = self.processor.process_list_with_total(flatten_to_mediaitems(), totalcount)
+        result = self.processor.process_list_with_total(flatten_to_mediaitems(), totalcount, runname='newmusic',
+            background=True)
         return result
 
-    def process_recentvideos(self):
+    def process_recentvideos(self, maxcount=None, settled_before=None):
+        recentvideos = _take_queued(self.recentvideos, maxcount, settled_before)
+        totalcount = sum(len(recentvideos[mediatype]) for mediatype in recentvideos)
+        if not totalcount:
+            return
         log("Processing recently added videos")
-        totalcount = sum(len(self.recentvideos[mediatype]) for mediatype in self.recentvideos)
-        if self.processor.process_list_with_total(self.iter_recentvideos(), totalcount):
-            self.reset_recent()
-
-    def iter_recentvideos(self):
-        added_seasons = []
-        added_moviesets = []
-        for mediatype in self.recentvideos:
-            for mediaid in self.recentvideos[mediatype]:
+        self.status = STATUS_PROCESSING
+        processed = set()
+        if self.scanning and not self.scanrun:
+            self.processor.open_run(runname='scanvideos')
+            self.scanrun = True
+        if not self._process_items(self.iter_recentvideos(recentvideos, processed), totalcount, 'recentvideos'):
+            _requeue(self.recentvideos, recentvideos)
+        elif self.scanning or self.signal == 'newvideos':
+            # the new videos pass after the scan skips these, also when the scan finished meanwhile
+            self.scanhandled.update(processed)
+        self._update_idle_status()
+
+    def _update_idle_status(self):
+        pending = self.signal or self.priorityitems or self.has_recent or self.has_recentmusic
+        self.status = STATUS_SIGNALLED if pending else STATUS_IDLE
+
+    def iter_recentvideos(self, recentvideos, processed):
+        added_seasons = set()
+        added_moviesets = set()
+        for mediatype in recentvideos:
+            for mediaid in recentvideos[mediatype]:
                 jsonitem = quickjson.get_item_details(mediaid, mediatype)
+                if not jsonitem:
+                    continue
+                processed.add((mediatype, mediaid))
                 yield info.MediaItem(jsonitem)
 
                 if mediatype == mediatypes.EPISODE and \
                         jsonitem.get('seasonid') and \
                         jsonitem['seasonid'] not in added_seasons:
-                    seasonitem = quickjson.get_item_details(jsonitem['seasonid'], mediatypes.SEASON)
-                    yield info.MediaItem(seasonitem)
-                    added_seasons.append(jsonitem['seasonid'])
+                    seasonitem = info.get_cached_parent(mediatypes.SEASON, jsonitem['seasonid'])
+                    if seasonitem:
+                        processed.add((mediatypes.SEASON, jsonitem['seasonid']))
+                        yield info.MediaItem(seasonitem)
+                    added_seasons.add(jsonitem['seasonid'])
 
                 if mediatype == mediatypes.MOVIE and \
                         jsonitem.get('setid') and \
                         jsonitem['setid'] not in added_moviesets:
-                    setitem = quickjson.get_item_details(jsonitem['setid'], mediatypes.MOVIESET)
-                    yield info.MediaItem(setitem)
-                    added_moviesets.append(jsonitem['setid'])
+                    setitem = info.get_cached_parent(mediatypes.MOVIESET, jsonitem['setid'])
+                    if setitem:
+                        processed.add((mediatypes.MOVIESET, jsonitem['setid']))
+                        yield info.MediaItem(setitem)
+                    added_moviesets.add(jsonitem['setid'])
+
+    def process_recentmusic(self):
+        recentmusic = _take_queued(self.recentmusic)
+        totalcount = sum(len(recentmusic[mediatype]) for mediatype in recentmusic)
+        if not totalcount:
+            return
+        log("Processing recently added music")
+        self.status = STATUS_PROCESSING
+        if not self._process_items(self.iter_recentmusic(recentmusic), totalcount, 'recentmusic'):
+            _requeue(self.recentmusic, recentmusic)
+        self._update_idle_status()
+
+    def iter_recentmusic(self, recentmusic):
+        added = set()
+        def iter_item(mediatype, dbid, parent=False):
+            if (mediatype, dbid) in added:
+                return
+            added.add((mediatype, dbid))
+            jsonitem = info.get_cached_parent(mediatype, dbid) if parent \
+                else quickjson.get_item_details(dbid, mediatype)
+            if not jsonitem:
+                return
+            yield info.MediaItem(jsonitem)
+
+            if mediatype == mediatypes.SONG and jsonitem.get('albumid'):
+                yield from iter_item(mediatypes.ALBUM, jsonitem['albumid'], True)
+            if mediatype in (mediatypes.SONG, mediatypes.ALBUM):
+                for artistid in jsonitem.get('albumartistid') or jsonitem.get('artistid') or ():
+                    yield from iter_item(mediatypes.ARTIST, artistid, True)
+
+        # artists and albums first, so songs don't process them again as parents
+        for mediatype in RECENT_MUSICTYPES:
+            for mediaid in recentmusic[mediatype]:
+                yield from iter_item(mediatype, mediaid)
 
     def onSettingsChanged(self):
         log("updating settings")
         settings.update_settings()
         mediatypes.update_settings()
 
+def _list_shared_items(share, mediatype, only_recent, shouldinclude_fn=None):
+    '''List only the IDs up front, then the full items of each block this client claims.
+    Returns (iterator, count) like `quickjson.iter_item_list`, the iterator also yields the number
+    of items skipped.'''
+    keylist, totalcount = quickjson.iter_item_keylist(mediatype, only_recent)
+    def iter_items():
+        dbids = []
+        skipped = 0
+        for item in keylist:
+            key = info.get_item_key(item)
+            if not shouldinclude_fn or shouldinclude_fn(key.dbid, key.mediatype, key.label):
+                dbids.append(key.dbid)
+            else:
+                skipped += 1
+        if skipped:
+            yield skipped
+        for block in share.iter_blocks(mediatype, dbids):
+            if isinstance(block, int):
+                yield block
+                continue
+            block, blockids = block
+            items = []
+            for start in range(0, len(blockids), DETAILS_BATCH_SIZE):
+                items.extend(quickjson.get_item_details_batch(blockids[start:start + DETAILS_BATCH_SIZE], mediatype))
+            # removed items aren't listed, the block is done when the listed ones are
+            share.start_block(block, mediatype, [info.get_item_key(item).dbid for item in items])
+            for item in items:
+                yield item
+    return iter_items(), totalcount
+
+def _queue_item(queue, mediatype, dbid, updated):
+    # move it to the end, it is updated again
+    queue[mediatype].pop(dbid, None)
+    queue[mediatype][dbid] = updated
+
+def _take_queued(queue, maxcount=None, settled_before=None):
+    '''Remove items from a recently added queue to process them, only those with no updates
+    since `settled_before` if it is set.'''
+    result = dict((mediatype, {}) for mediatype in queue)
+    count = 0
+    for mediatype, items in queue.items():
+        for mediaid, updated in list(items.items()):
+            if maxcount is not None and count >= maxcount:
+                return result
+            if settled_before is not None and updated > settled_before:
+                continue
+            result[mediatype][mediaid] = items.pop(mediaid)
+            count += 1
+    return result
+
+def _requeue(queue, taken):
+    for mediatype, items in taken.items():
+        for mediaid, updated in items.items():
+            queue[mediatype].setdefault(mediaid, updated)
+
 def _get_date_numeric(past_days=0):
     '''Get the unix timestamp of the date `past_days` in the the past.'''
     date = pykodi.datetime_now(timezone.utc)
@@ -0,0 +1,3 @@
+from kodistubs import install_kodi_modules
+
+install_kodi_modules()
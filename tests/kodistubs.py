@@ -0,0 +1,84 @@
+'''Minimal stand-ins for the Kodi modules, enough to import the add-on libraries outside Kodi.
+Used by the tests and the benchmarks.'''
+import os
+import re
+import shutil
+import sys
+import types
+
+PYTHON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python')
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+def _clean_movie_title(title):
+    match = re.match(r'(.*?)[ ._]\(?(\d{4})\)?$', title)
+    return (match.group(1), match.group(2)) if match else (title, '')
+
+class _File(object):
+    def __init__(self, path, mode='r'):
+        self.file = open(path, mode, encoding='utf-8')
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.file.close()
+    def read(self):
+        return self.file.read()
+    def write(self, content):
+        self.file.write(content)
+        return True
+
+def _listdir(path):
+    if not os.path.isdir(path):
+        return [], []
+    entries = sorted(os.listdir(path))
+    return [entry for entry in entries if os.path.isdir(os.path.join(path, entry))], \
+        [entry for entry in entries if not os.path.isdir(os.path.join(path, entry))]
+
+def _rmdir(path, force=False):
+    shutil.rmtree(path) if force else os.rmdir(path)
+    return True
+
+def _makedirs(path):
+    os.makedirs(path, exist_ok=True)
+    return True
+
+class _Addon(object):
+    settings = {}
+    def __init__(self, id=None):
+        pass
+    def getAddonInfo(self, key):
+        return {'id': 'script.artwork.dump', 'version': '0.0.0', 'profile': '/tmp/artworkdump-tests/',
+            'path': os.path.dirname(PYTHON_DIR)}.get(key, '')
+    def getSetting(self, key):
+        return str(self.settings.get(key, ''))
+    def getSettingBool(self, key):
+        return bool(self.settings.get(key, False))
+    def getSettingInt(self, key):
+        return int(self.settings.get(key, 0))
+    def getSettingNumber(self, key):
+        return float(self.settings.get(key, 0))
+    def getSettingString(self, key):
+        return str(self.settings.get(key, ''))
+    def setSetting(self, key, value):
+        self.settings[key] = value
+    def getLocalizedString(self, id):
+        return str(id)
+
+def install_kodi_modules():
+    if PYTHON_DIR not in sys.path:
+        sys.path.insert(0, PYTHON_DIR)
+    if 'xbmc' in sys.modules:
+        return
+    sys.modules['xbmc'] = _module('xbmc', LOGDEBUG=0, LOGINFO=1, LOGWARNING=2, LOGERROR=3,
+        log=lambda msg, level=0: None, executebuiltin=lambda command: None, executeJSONRPC=lambda command: '{}',
+        getCondVisibility=lambda condition: False, getInfoLabel=lambda label: '', sleep=lambda ms: None,
+        getUserAgent=lambda: 'Kodi/21.0', getLocalizedString=str, getCleanMovieTitle=_clean_movie_title,
+        Monitor=object, Player=object)
+    sys.modules['xbmcaddon'] = _module('xbmcaddon', Addon=_Addon)
+    sys.modules['xbmcvfs'] = _module('xbmcvfs', exists=os.path.exists, translatePath=lambda path: path,
+        listdir=_listdir, mkdir=_makedirs, mkdirs=_makedirs, rmdir=_rmdir, File=_File,
+        delete=lambda path: os.remove(path) or True)
+    sys.modules['xbmcgui'] = _module('xbmcgui', Dialog=object, DialogProgress=object, DialogProgressBG=object)
@@ -0,0 +1,34 @@
+import pytest
+
+from libs.addonsettings import settings
+from libs.processeditems import AvailableArt
+
+@pytest.fixture
+def record(tmp_path, monkeypatch):
+    settings.update_settings()
+    monkeypatch.setattr(settings, 'datapath', str(tmp_path) + '/')
+    return AvailableArt()
+
+def stored(record):
+    return sorted((row['mediaid'], row['mediatype']) for row in record.db.fetchall("SELECT * FROM availableart"))
+
+def test_rows_written_together(record):
+    record.set_urls(1, 'movie', 'hash1', 5, ['a'])
+    record.set_urls(2, 'movie', 'hash2', 5, ['b'])
+    assert stored(record) == []
+    assert record.get_urls(1, 'movie', 'hash1', 5) == ['a']
+    assert record.get_urls(1, 'movie', 'changed', 5) is None
+
+    record.commit()
+    assert stored(record) == [(1, 'movie'), (2, 'movie')]
+    assert record.get_urls(2, 'movie', 'hash2', 5) == ['b']
+
+def test_prune_removed_items(record):
+    for dbid in (1, 2, 3):
+        record.set_urls(dbid, 'movie', 'hash', 5, [])
+    record.set_urls(2, 'tvshow', 'hash', 5, [])
+    record.commit()
+    record.set_urls(4, 'movie', 'hash', 5, [])
+
+    assert record.prune('movie', {1, 3}) == 2
+    assert stored(record) == [(1, 'movie'), (2, 'tvshow'), (3, 'movie')]
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def run_isolated(code):
+    '''Run `code` in a new interpreter with the Kodi stand-ins, so modules imported by other tests don't count.'''
+    script = 'import kodistubs\nkodistubs.install_kodi_modules()\n' + code
+    result = subprocess.run([sys.executable, '-c', script], cwd=TESTS_DIR, capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+def test_service_import_is_light():
+    loaded, requests, mediatypes_loaded = run_isolated('''
+import sys
+import xbmcaddon
+reads = []
+getter = xbmcaddon.Addon.getSetting
+xbmcaddon.Addon.getSetting = lambda self, key: reads.append(key) or getter(self, key)
+import service
+from libs import mediatypes
+from libs.addonsettings import settings
+print(bool(settings.__dict__.get('loaded')) or bool(reads), 'requests' in sys.modules, mediatypes._settings_loaded)
+''')
+    assert loaded == 'False'
+    assert requests == 'False'
+    assert mediatypes_loaded == 'False'
+
+def test_settings_load_on_first_use():
+    loaded, = run_isolated('''
+from libs.addonsettings import settings
+settings.enableservice
+print(settings.__dict__.get('loaded'))
+''')
+    assert loaded == 'True'
+
+def test_requests_imported_for_downloads():
+    imported, = run_isolated('''
+import sys
+from libs import webhelper
+webhelper.get_shared_session(2)
+print('requests' in sys.modules)
+''')
+    assert imported == 'True'
@@ -0,0 +1,72 @@
+import os
+import re
+
+from libs.utils import PathMatcher
+
+PATHS = ('/x/aa/movie.mkv', '/x/ab/movie.mkv', '/a/bb/movie.mkv', '/a/bc/movie.mkv', '/q/movie.mkv',
+    'smb://server/share/Trailers/movie.mkv', 'smb://server/share/trailers/movie.mkv', '/media/tv/Show/S01E01.mkv',
+    'C:\\Movies\\Sample\\movie.mkv', '/z/movie-sample.mkv')
+
+def reference_matches(regexes, path):
+    '''Each regex checked separately, as before they were combined.'''
+    return any(re.match(regex, path) for regex in regexes)
+
+def check_same(regexes):
+    matcher = PathMatcher((), (), regexes)
+    for path in PATHS:
+        assert matcher.matches(path) == reference_matches(regexes, path), (regexes, path)
+
+def test_numbered_backreferences():
+    regexes = [r'/x/(\w)\1', r'/a/(\w)\1']
+    matcher = PathMatcher((), (), regexes)
+    assert matcher.matches('/a/bb')
+    assert matcher.matches('/x/aa')
+    assert not matcher.matches('/a/bc')
+    check_same(regexes)
+
+def test_named_backreferences():
+    check_same([r'/x/(?P<c>\w)(?P=c)', r'/a/(?P<c>\w)(?P=c)', r'/q/'])
+
+def test_plain_patterns_combined():
+    regexes = [r'/q/', r'.*[Tt]railers/', r'.*-sample\.']
+    assert len(PathMatcher((), (), regexes).regexes) == 1
+    check_same(regexes)
+
+def test_mixed_patterns():
+    check_same([r'/q/', r'/a/(\w)\1', r'(?i).*TRAILERS', r'.*S\d\dE\d\d', r'.*[Ss]ample'])
+
+def test_invalid_pattern_ignored():
+    matcher = PathMatcher((), (), [r'(unclosed', r'/q/'])
+    assert matcher.matches('/q/movie.mkv')
+    assert not matcher.matches('/x/aa/movie.mkv')
+
+FOLDER_PATHS = ('/media/Movies/Alien (1979)/Alien.mkv', '/media/Movies2/Alien.mkv', '/media/Movies', '/media/Movies/',
+    '/media/TV/../Movies/Alien.mkv', '/media//Movies/Alien.mkv', '/media/./Movies/Alien.mkv', '/media/Other/Alien.mkv',
+    'smb://NAS/Media/Movies/Alien.mkv', 'smb://NAS/Media/MoviesHD/Alien.mkv', 'smb://NAS/Media/TV/Show/S01E01.mkv',
+    'C:\\Media\\Movies\\Alien.mkv', 'C:\\Media\\TV\\Show\\S01E01.mkv',
+    'stack:///media/Movies/Alien cd1.mkv , /media/Movies/Alien cd2.mkv')
+
+FOLDERS = ('/media/Movies', '/media/Movies/', '/media/Movies//', '/media/TV/../Movies/', 'smb://NAS/Media/Movies/',
+    'smb://NAS/Media/Movies', 'C:\\Media\\Movies\\', '/')
+
+def reference_folder_matches(folder, path):
+    '''The folder rule before it was compiled, paths without symlinks resolve the same.'''
+    path_file = os.path.realpath(os.path.join(path, ''))
+    path_excl = os.path.realpath(os.path.join(folder, ''))
+    return os.path.commonprefix([path_file, path_excl]) == path_excl
+
+def test_folders_match_like_before():
+    for folder in FOLDERS:
+        matcher = PathMatcher((folder,))
+        for path in FOLDER_PATHS:
+            assert matcher.matches(path) == reference_folder_matches(folder, path), (folder, path)
+
+def test_prefixes_match_like_before():
+    prefixes = ('/media/Movies', 'smb://NAS/Media/Movies/', 'C:\\Media\\TV\\')
+    for prefix in prefixes:
+        matcher = PathMatcher((), (prefix,))
+        for path in FOLDER_PATHS:
+            assert matcher.matches(path) == path.startswith(prefix), (prefix, path)
+    matcher = PathMatcher((), prefixes)
+    for path in FOLDER_PATHS:
+        assert matcher.matches(path) == any(path.startswith(prefix) for prefix in prefixes), path
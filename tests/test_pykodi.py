@@ -0,0 +1,13 @@
+import json
+
+from libs import mediainfo
+from libs.pykodi import ObjectJSONEncoder
+
+def test_slots_object_encoded():
+    item = mediainfo.MediaItem({'movieid': 3, 'label': 'Alien', 'file': '/media/Movies/Alien.mkv', 'art': {}})
+    result = json.loads(json.dumps(item, cls=ObjectJSONEncoder))
+    assert result['dbid'] == 3
+    assert result['label'] == 'Alien'
+    assert result['updatedart'] == {}
+    # set only for episodes and seasons
+    assert 'showtitle' not in result
@@ -0,0 +1,150 @@
+import json
+
+import pytest
+import xbmcaddon
+
+from libs import workshare
+from libs.addonsettings import settings
+from libs.workshare import WorkShare, SHARE_BLOCK_SIZE
+
+@pytest.fixture(autouse=True)
+def share_folder(tmp_path):
+    xbmcaddon.Addon.settings.update({'share_work': True, 'share_path': str(tmp_path), 'share_clientid': 'a'})
+    settings.update_settings()
+    yield tmp_path
+    xbmcaddon.Addon.settings.clear()
+    settings.update_settings()
+
+def client(clientid, runname='newvideos'):
+    settings.share_clientid = clientid
+    return WorkShare(runname)
+
+def claim_all(share, dbids, mediatype='episode'):
+    '''Go through every block like a run, returning the IDs this client got and processed.'''
+    result = []
+    for block in share.iter_blocks(mediatype, dbids):
+        if not isinstance(block, int):
+            block, blockids = block
+            share.start_block(block, mediatype, blockids)
+            for dbid in blockids:
+                share.item_done(mediatype, dbid)
+            result.extend(blockids)
+    return result
+
+def test_next_run_gets_blocks_again():
+    first = client('a')
+    assert claim_all(first, [4100]) == [4100]
+    first.finish(True)
+
+    second = client('a')
+    assert second.runpath != first.runpath
+    assert claim_all(second, [4100, 4101]) == [4100, 4101]
+    # joins the run in progress
+    assert claim_all(client('b'), [4100, 4101]) == []
+    second.finish(True)
+
+    assert claim_all(client('b'), [4100, 4101]) == [4100, 4101]
+
+def test_clients_in_one_run_split_blocks():
+    dbids = list(range(SHARE_BLOCK_SIZE * 3))
+    first = client('a')
+    second = client('b')
+    assert first.runpath == second.runpath
+
+    firstblocks = first.iter_blocks('episode', dbids)
+    secondblocks = second.iter_blocks('episode', dbids)
+    # each claims one block as the list is read, the other moves on to the next one
+    assert next(firstblocks) == ('episode-0', list(range(SHARE_BLOCK_SIZE)))
+    assert next(secondblocks) == ('episode-1', list(range(SHARE_BLOCK_SIZE, SHARE_BLOCK_SIZE * 2)))
+    assert next(firstblocks) == ('episode-2', list(range(SHARE_BLOCK_SIZE * 2, SHARE_BLOCK_SIZE * 3)))
+    # blocks the other client has are counted at the end
+    assert list(secondblocks) == [SHARE_BLOCK_SIZE, SHARE_BLOCK_SIZE]
+    assert list(firstblocks) == [SHARE_BLOCK_SIZE]
+
+def test_unfinished_block_given_back():
+    first = client('a')
+    blocks = first.iter_blocks('movie', [1, 2, SHARE_BLOCK_SIZE + 1])
+    block, blockids = next(blocks)
+    first.start_block(block, 'movie', blockids)
+    first.item_done('movie', 1)
+    first.finish(False)
+
+    second = client('b')
+    assert second.runpath == first.runpath
+    assert claim_all(second, [1, 2, SHARE_BLOCK_SIZE + 1], 'movie') == [1, 2, SHARE_BLOCK_SIZE + 1]
+
+def test_read_ahead_blocks_given_back():
+    '''The list is read ahead of processing, so the next block is claimed before the last one is done.'''
+    dbids = [1, 2, SHARE_BLOCK_SIZE + 1]
+    first = client('a')
+    blocks = first.iter_blocks('movie', dbids)
+    for block, blockids in blocks:
+        first.start_block(block, 'movie', blockids)
+    first.item_done('movie', 1)
+    first.item_done('movie', 2)
+    first.finish(False)
+
+    assert claim_all(client('b'), dbids, 'movie') == [SHARE_BLOCK_SIZE + 1]
+
+def test_given_back_block_claimed_at_end():
+    dbids = [1, SHARE_BLOCK_SIZE + 1]
+    first = client('a')
+    second = client('b')
+    firstblocks = first.iter_blocks('movie', dbids)
+    block, blockids = next(firstblocks)
+    first.start_block(block, 'movie', blockids)
+
+    secondblocks = second.iter_blocks('movie', dbids)
+    assert next(secondblocks) == ('movie-1', [SHARE_BLOCK_SIZE + 1])
+    first.finish(False)
+    assert next(secondblocks) == ('movie-0', [1])
+
+def test_stale_run_not_joined(share_folder):
+    first = client('a')
+    with open(first.runpath + workshare.RUNINFO_FILENAME, 'w') as f:
+        json.dump({'client': 'a', 'started': 0}, f)
+
+    second = client('b')
+    assert second.runpath != first.runpath
+    assert claim_all(second, [1], 'movie') == [1]
+
+def test_parent_items_claimed_once():
+    first = client('a')
+    second = client('b')
+    assert first.claim_item('season', 7)
+    assert not second.claim_item('season', 7)
+    assert second.claim_item('tvshow', 7)
+
+def test_disabled():
+    xbmcaddon.Addon.settings['share_work'] = False
+    settings.update_settings()
+    share = WorkShare('allvideos')
+    assert not share.enabled
+    assert share.claim_item('movie', 1)
+    share.finish(True)
+
+def test_run_finished_by_last_client():
+    dbids = [1, SHARE_BLOCK_SIZE + 1]
+    first = client('a')
+    second = client('b')
+    firstblocks = first.iter_blocks('movie', dbids)
+    block, blockids = next(firstblocks)
+    first.start_block(block, 'movie', blockids)
+
+    assert claim_all(second, dbids, 'movie') == [SHARE_BLOCK_SIZE + 1]
+    second.finish(True)
+    # the first client is still working on its block
+    assert client('c').runpath == first.runpath
+
+    first.item_done('movie', 1)
+    assert list(firstblocks) == [1]
+    first.finish(True)
+    assert client('c').runpath != first.runpath
+
+def test_stale_heartbeat_not_joined():
+    first = client('a')
+    assert claim_all(first, [1], 'movie') == [1]
+    with open(first.runpath + workshare.HEARTBEAT_FILENAME, 'w') as f:
+        f.write(str(1000.0))
+
+    assert client('b').runpath != first.runpath